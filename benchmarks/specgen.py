@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+r"""
+Seeded generator of the synthetic specs for the scale testing.
+
+The specs are assembled from the fragments of the acceptance test inputs (dependencies,
+conditions, %define bodies, %files entries and description texts), so they look like the real
+ones, but the number of subpackages, dependencies, patches, ... can be as large as needed. The
+same seed and counts always give the same spec.
+
+Run it from the top directory of the repository:
+
+    python3 benchmarks/specgen.py [--seed N] [--subpackages N] [--dependencies N] \\
+        [--if-depth N] [--files N] [--patches N] [--defines N] [-o FILE]
+"""
+
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+from typing import Dict, List, Optional, Set, TextIO
+
+RE_SECTION = re.compile(r'^%(package|description|prep|build|install|check|files|changelog)\b')
+RE_DEPENDENCY = re.compile(r'^(?:BuildRequires|Requires|Recommends|Suggests):\s*(\S.*)$')
+RE_CONDITION = re.compile(r'^%if\s+(0%\{\?\w+\}.*|%\{with(out)? \w+\})$')
+RE_DEFINE = re.compile(r'^%(?:define|global)\s+\w+\s+(\S.*)$')
+RE_FILE = re.compile(r'^(?:%(?:doc|license|dir|config\S*|attr\S*)\s+)?%\{_\w+\}/\S+$')
+
+
+class Fragments(object):
+    """
+    Lines collected from the acceptance test inputs.
+
+    Attributes:
+        dependencies: A list of the values of the dependency tags.
+        conditions: A list of the '%if' lines.
+        defines: A list of the bodies of the one-line macro definitions.
+        files: A list of the '%files' entries.
+        descriptions: A list of the lines of the descriptions.
+    """
+
+    dependencies: List[str]
+    conditions: List[str]
+    defines: List[str]
+    files: List[str]
+    descriptions: List[str]
+
+    def __init__(self, directory: str = os.path.join('tests', 'in')) -> None:
+        """
+        Collect the lines of all the specs in the directory.
+
+        Args:
+            directory: A string with the directory of the specs.
+        """
+        collected: Dict[str, Set[str]] = {
+            'dependencies': set(),
+            'conditions': set(),
+            'defines': set(),
+            'files': set(),
+            'descriptions': set(),
+        }
+        for path in sorted(glob.glob(os.path.join(directory, '*.spec'))):
+            with open(path, errors='replace') as f:
+                self._collect(f, collected)
+        # sorted so the generator gives the same spec for the seed
+        for kind, lines in collected.items():
+            setattr(self, kind, sorted(lines))
+
+    @staticmethod
+    def _collect(lines: TextIO, collected: Dict[str, Set[str]]) -> None:
+        section = 'preamble'
+        for line in lines:
+            line = line.rstrip()
+            match = RE_SECTION.match(line)
+            if match:
+                section = match.group(1)
+                continue
+            if line.endswith('\\') or '%(' in line:
+                continue
+            if section in ('preamble', 'package'):
+                match = RE_DEPENDENCY.match(line)
+                if match:
+                    collected['dependencies'].add(match.group(1))
+            if RE_CONDITION.match(line):
+                collected['conditions'].add(line)
+            match = RE_DEFINE.match(line)
+            if match:
+                collected['defines'].add(match.group(1))
+            if section == 'files' and RE_FILE.match(line):
+                collected['files'].add(line)
+            if section == 'description' and line and not line.startswith(('%', '#')):
+                collected['descriptions'].add(line)
+
+
+class SpecGenerator(object):
+    """
+    Generate the synthetic specs.
+
+    Attributes:
+        fragments: The Fragments the specs are assembled from.
+        random: The random.Random generator seeded by the given seed.
+    """
+
+    def __init__(self, seed: int = 0, fragments: Optional[Fragments] = None) -> None:
+        """
+        Seed the generator.
+
+        Args:
+            seed: An int with the seed of the generator.
+            fragments: The Fragments the specs are assembled from (collected from the acceptance
+                       test inputs by default).
+        """
+        self.fragments = fragments or Fragments()
+        self.random = random.Random(seed)
+
+    def _pick(self, kind: str) -> str:
+        return self.random.choice(getattr(self.fragments, kind))
+
+    def _conditional(self, lines: List[str], depth: int) -> List[str]:
+        """Wrap the lines in the given number of nested conditions."""
+        if not depth:
+            return lines
+        wrapped = self._conditional(lines, depth - 1)
+        return [self._pick('conditions')] + wrapped + ['%endif']
+
+    def _dependencies(self, tag: str, count: int, if_depth: int) -> List[str]:
+        """Get the dependency lines, the later ones are nested deeper in the conditions."""
+        lines = []
+        groups = if_depth + 1
+        for depth in range(groups):
+            group = [
+                '{0}: {1}'.format(tag, self._pick('dependencies'))
+                for _ in range(count // groups + (depth < count % groups))
+            ]
+            if group:
+                lines += self._conditional(group, depth)
+        return lines
+
+    def _description(self, name: str) -> List[str]:
+        lines = ['%description' + name]
+        lines += [self._pick('descriptions') for _ in range(self.random.randint(1, 4))]
+        return lines + ['']
+
+    def generate(
+        self,
+        subpackages: int = 10,
+        dependencies: int = 20,
+        if_depth: int = 2,
+        files: int = 5,
+        patches: int = 5,
+        defines: int = 5,
+    ) -> str:
+        """
+        Generate the spec.
+
+        Args:
+            subpackages: An int with the number of the subpackages.
+            dependencies: An int with the number of BuildRequires (the subpackages get a tenth
+                          of them as Requires).
+            if_depth: An int with the maximal depth of the nested conditions.
+            files: An int with the number of %files entries of each package.
+            patches: An int with the number of patches.
+            defines: An int with the number of the macro definitions.
+
+        Returns:
+            A string with the spec.
+        """
+        lines = [
+            '%define synthetic_{0} {1}'.format(index, self._pick('defines'))
+            for index in range(defines)
+        ]
+        lines += [
+            'Name:           synthetic',
+            'Version:        1.0',
+            'Release:        0',
+            'Summary:        Synthetic spec for the scale testing',
+            'License:        MIT',
+            'Group:          Development/Libraries/C and C++',
+            'URL:            https://example.org/synthetic',
+            'Source0:        https://example.org/%{name}-%{version}.tar.gz',
+        ]
+        lines += [
+            'Patch{0}:        synthetic-fix-{0}.patch'.format(index) for index in range(patches)
+        ]
+        lines += self._dependencies('BuildRequires', dependencies, if_depth)
+        lines += ['']
+        lines += self._description('')
+        for index in range(subpackages):
+            lines += [
+                '%package -n libsynthetic{0}'.format(index),
+                'Summary:        Synthetic library {0}'.format(index),
+                'Group:          System/Libraries',
+                'Provides:       synthetic-lib{0} = %{{version}}'.format(index),
+            ]
+            lines += self._dependencies('Requires', max(dependencies // 10, 1), if_depth)
+            lines += ['']
+            lines += self._description(' -n libsynthetic{0}'.format(index))
+        lines += ['%prep', '%setup -q']
+        lines += ['%patch{0} -p1'.format(index) for index in range(patches)]
+        lines += [
+            '',
+            '%build',
+            '%configure --disable-static',
+            'make %{?_smp_mflags}',
+            '',
+            '%install',
+            'make DESTDIR=$RPM_BUILD_ROOT install',
+            'find %{buildroot} -type f -name "*.la" -delete -print',
+            '',
+            '%check',
+            'make %{?_smp_mflags} check',
+            '',
+        ]
+        for index in range(subpackages):
+            lines += [
+                '%post -n libsynthetic{0} -p /sbin/ldconfig'.format(index),
+                '%postun -n libsynthetic{0} -p /sbin/ldconfig'.format(index),
+                '',
+            ]
+        lines += ['%files', '%license COPYING']
+        lines += [self._pick('files') for _ in range(files)]
+        lines += ['']
+        for index in range(subpackages):
+            lines += ['%files -n libsynthetic{0}'.format(index)]
+            lines += [self._pick('files') for _ in range(files)]
+            lines += ['']
+        lines += ['%changelog']
+        return '\n'.join(lines) + '\n'
+
+
+def main() -> None:
+    """Generate the spec with the counts given on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generator')
+    parser.add_argument('--subpackages', type=int, default=10, help='number of subpackages')
+    parser.add_argument('--dependencies', type=int, default=20, help='number of BuildRequires')
+    parser.add_argument('--if-depth', type=int, default=2, help='depth of the nested conditions')
+    parser.add_argument('--files', type=int, default=5, help='number of %%files entries')
+    parser.add_argument('--patches', type=int, default=5, help='number of patches')
+    parser.add_argument('--defines', type=int, default=5, help='number of macro definitions')
+    parser.add_argument('-o', '--output', help='output file (stdout by default)')
+    args = parser.parse_args()
+
+    spec = SpecGenerator(args.seed).generate(
+        subpackages=args.subpackages,
+        dependencies=args.dependencies,
+        if_depth=args.if_depth,
+        files=args.files,
+        patches=args.patches,
+        defines=args.defines,
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(spec)
+    else:
+        sys.stdout.write(spec)
+
+
+if __name__ == '__main__':
+    main()
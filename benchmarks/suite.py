@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of spec-cleaner.
+
+It measures:
+  * cold-start: the whole spec-cleaner process run on a small spec (start-up, data loading,
+    'rpm --showrc'),
+  * throughput: cleaning of all the specs of the acceptance test corpus in each option preset,
+  * sections: lines per second of each section class over the corpus (reading and output),
+  * scaling: cleaning of the synthetic specs (see specgen.py) of increasing size.
+
+Run it from the top directory of the repository:
+
+    python3 benchmarks/suite.py [--repeat N] [--only BENCHMARK] [--json FILE] [--compare FILE]
+
+The results stored with '--json' can be compared with the results of another commit by
+'--compare'.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from collections import defaultdict
+from typing import Any, Callable, DefaultDict, Dict, Iterator, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from spec_cleaner import RpmSpecCleaner
+from spec_cleaner.rpmbuild import RpmBuild
+from spec_cleaner.rpmcheck import RpmCheck
+from spec_cleaner.rpmcopyright import RpmCopyright
+from spec_cleaner.rpmdescription import RpmDescription
+from spec_cleaner.rpmfiles import RpmFiles
+from spec_cleaner.rpminstall import RpmInstall
+from spec_cleaner.rpmpackage import RpmPackage
+from spec_cleaner.rpmpreamble import RpmPreamble
+from spec_cleaner.rpmprep import RpmPrep
+from spec_cleaner.rpmprune import RpmChangelog, RpmClean
+from spec_cleaner.rpmscriplets import RpmScriptlets
+from specgen import SpecGenerator
+
+SECTIONS = (
+    RpmCopyright,
+    RpmPreamble,
+    RpmPackage,
+    RpmDescription,
+    RpmPrep,
+    RpmBuild,
+    RpmCheck,
+    RpmInstall,
+    RpmScriptlets,
+    RpmFiles,
+    RpmChangelog,
+    RpmClean,
+)
+
+PRESETS = {
+    'normal': {},
+    'minimal': {'minimal': True},
+    'pkgconfig': {'pkgconfig': True},
+    'perl': {'perl': True},
+    'tex': {'tex': True},
+    'cmake': {'cmake': True},
+}
+
+DEFAULT_OPTIONS = {
+    'output': os.devnull,
+    'inline': False,
+    'diff': False,
+    'diff_format': 'program',
+    'diff_prog': 'vimdiff',
+    'minimal': False,
+    'no_curlification': False,
+    'no_copyright': True,
+    'copyright_year': 2013,
+    'remove_groups': False,
+    'pkgconfig': False,
+    'tex': False,
+    'perl': False,
+    'cmake': False,
+    'keep_space': False,
+}
+
+# numbers of the subpackages of the generated specs
+SCALING_SIZES = (1, 10, 100, 1000)
+
+BENCHMARKS = ('cold-start', 'throughput', 'sections', 'scaling')
+
+
+def corpus() -> List[str]:
+    """Get the paths of the acceptance test inputs."""
+    return sorted(glob.glob(os.path.join('tests', 'in', '*.spec')))
+
+
+def count_lines(path: str) -> int:
+    """
+    Count the lines of the file.
+
+    Args:
+        path: A string with the path to the file.
+
+    Returns:
+        An int with the number of the lines.
+    """
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+def clean(spec: str, options: Dict[str, Any]) -> None:
+    """
+    Clean the spec with the given options (the warnings are dropped).
+
+    Args:
+        spec: A string with the path to the spec.
+        options: A dict with the options overriding the DEFAULT_OPTIONS.
+    """
+    full_options = dict(DEFAULT_OPTIONS, specfile=spec, **options)
+    with contextlib.redirect_stderr(io.StringIO()):
+        cleaner = RpmSpecCleaner(full_options)
+        cleaner.run()
+        del cleaner
+
+
+def generate_spec(path: str, packages: int) -> None:
+    """
+    Write the synthetic spec with the given number of subpackages (and other counts scaled).
+
+    Args:
+        path: A string with the path the spec is written to.
+        packages: An int with the number of the subpackages.
+    """
+    spec = SpecGenerator(seed=packages).generate(
+        subpackages=packages,
+        dependencies=2 * packages,
+        if_depth=3,
+        files=3,
+        patches=packages,
+        defines=max(packages // 10, 1),
+    )
+    with open(path, 'w') as f:
+        f.write(spec)
+
+
+def bench_cold_start(repeat: int) -> Dict[str, float]:
+    """
+    Time the whole spec-cleaner process.
+
+    Args:
+        repeat: An int with the number of the timed runs.
+
+    Returns:
+        A dict with the best time in 'seconds'.
+    """
+    spec = os.path.join('tests', 'in', 'bconds.spec')
+    command = [sys.executable, '-m', 'spec_cleaner', spec]
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return {'seconds': min(timings)}
+
+
+def bench_throughput(repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Time the cleaning of the whole corpus in each preset.
+
+    Args:
+        repeat: An int with the number of the timed runs.
+
+    Returns:
+        A dict mapping the presets to the dicts with the best time and the rates.
+    """
+    specs = corpus()
+    lines = sum(count_lines(spec) for spec in specs)
+    results = {}
+    for preset, options in PRESETS.items():
+
+        def work() -> None:
+            for spec in specs:
+                clean(spec, options)
+
+        seconds = min(timeit.repeat(work, number=1, repeat=repeat))
+        results[preset] = {
+            'seconds': seconds,
+            'specs': len(specs),
+            'lines': lines,
+            'specs_per_second': len(specs) / seconds,
+            'lines_per_second': lines / seconds,
+        }
+    return results
+
+
+@contextlib.contextmanager
+def timed_sections(stats: DefaultDict[str, Dict[str, Any]]) -> Iterator[None]:
+    """
+    Collect the time spent in the sections (and the number of lines read) in the stats.
+
+    Args:
+        stats: A defaultdict mapping the names of the section classes to the dicts with the
+               'seconds' and the 'lines'.
+    """
+    # the methods are taken before any is wrapped, so the inherited ones are not timed twice
+    originals = {cls: (cls.read, cls.output) for cls in SECTIONS}
+    # the attributes set on the classes (and not just inherited) before the wrapping
+    own = {cls: [name for name in ('read', 'output') if name in vars(cls)] for cls in SECTIONS}
+
+    def timed(method: Callable[..., Any], counts_lines: bool) -> Callable[..., Any]:
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                entry = stats[type(self).__name__]
+                entry['seconds'] += time.perf_counter() - start
+                if counts_lines:
+                    entry['lines'] += 1
+
+        return wrapper
+
+    for cls, (read, output) in originals.items():
+        setattr(cls, 'read', timed(read, True))
+        setattr(cls, 'output', timed(output, False))
+    try:
+        yield
+    finally:
+        for cls, (read, output) in originals.items():
+            setattr(cls, 'read', read)
+            setattr(cls, 'output', output)
+            for name in ('read', 'output'):
+                if name not in own[cls]:
+                    delattr(cls, name)
+
+
+def bench_sections(repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Compute the lines per second of each section class (the best of the runs).
+
+    Args:
+        repeat: An int with the number of the timed runs.
+
+    Returns:
+        A dict mapping the names of the section classes to the dicts with the time and the rate.
+    """
+    specs = corpus()
+    best: Dict[str, Dict[str, float]] = {}
+    for _ in range(repeat):
+        stats: DefaultDict[str, Dict[str, Any]] = defaultdict(lambda: {'lines': 0, 'seconds': 0.0})
+        with timed_sections(stats):
+            for spec in specs:
+                clean(spec, PRESETS['normal'])
+        for name, entry in stats.items():
+            if name not in best or entry['seconds'] < best[name]['seconds']:
+                best[name] = dict(entry)
+    results = {}
+    for cls in SECTIONS:
+        timings = best.get(cls.__name__)
+        if timings:
+            timings['lines_per_second'] = (
+                timings['lines'] / timings['seconds'] if timings['seconds'] else 0
+            )
+            results[cls.__name__] = timings
+    return results
+
+
+def bench_scaling(repeat: int) -> List[Dict[str, float]]:
+    """
+    Time the cleaning of the generated specs of increasing size.
+
+    Args:
+        repeat: An int with the number of the timed runs.
+
+    Returns:
+        A list of the dicts with the size, the best time and the rate of each spec.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for packages in SCALING_SIZES:
+            spec = os.path.join(directory, 'bench-{0}.spec'.format(packages))
+            generate_spec(spec, packages)
+            lines = count_lines(spec)
+            seconds = min(
+                timeit.repeat(lambda: clean(spec, PRESETS['normal']), number=1, repeat=repeat)
+            )
+            results.append(
+                {
+                    'packages': packages,
+                    'lines': lines,
+                    'seconds': seconds,
+                    'lines_per_second': lines / seconds,
+                }
+            )
+    return results
+
+
+def flatten(results: Any, prefix: str = '') -> Dict[str, float]:
+    """
+    Get the timings of the results as a dict mapping the metric names to the seconds.
+
+    Args:
+        results: The results of the benchmarks (nested dicts and lists).
+        prefix: A string with the name of the metric of the results.
+
+    Returns:
+        A dict mapping the metric names to the seconds.
+    """
+    flat = {}
+    if isinstance(results, dict):
+        if 'seconds' in results:
+            flat[prefix] = results['seconds']
+        for key, value in results.items():
+            if isinstance(value, (dict, list)):
+                flat.update(flatten(value, '{0}/{1}'.format(prefix, key) if prefix else key))
+    elif isinstance(results, list):
+        for entry in results:
+            flat.update(flatten(entry, '{0}/{1}'.format(prefix, entry['packages'])))
+    return flat
+
+
+def git_commit() -> Optional[str]:
+    """Get the hash of the current commit (or None if it is not known)."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    """Run the benchmarks and print (store, compare) the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs')
+    parser.add_argument(
+        '--only', action='append', choices=BENCHMARKS, help='run only the given benchmark'
+    )
+    parser.add_argument('--json', metavar='FILE', help='store the results in the JSON file')
+    parser.add_argument(
+        '--compare', metavar='FILE', help='compare the results with the stored JSON file'
+    )
+    args = parser.parse_args()
+
+    functions = {
+        'cold-start': bench_cold_start,
+        'throughput': bench_throughput,
+        'sections': bench_sections,
+        'scaling': bench_scaling,
+    }
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = functions[name](args.repeat)
+
+    print('{0:40} {1:>12}'.format('benchmark', 'seconds'))
+    for metric, seconds in flatten(results).items():
+        print('{0:40} {1:>12.4f}'.format(metric, seconds))
+
+    if args.json:
+        data = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': args.repeat,
+            'results': results,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        old_flat = flatten(old['results'])
+        print()
+        print('compared with {0}'.format(old.get('commit') or args.compare))
+        print('{0:40} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'old', 'new', 'ratio'))
+        for metric, seconds in flatten(results).items():
+            if old_flat.get(metric):
+                print(
+                    '{0:40} {1:>12.4f} {2:>12.4f} {3:>7.2f}x'.format(
+                        metric, old_flat[metric], seconds, seconds / old_flat[metric]
+                    )
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 import argparse
 import os
 
+from spec_cleaner.license_parser import load_license_database
+
 parser = argparse.ArgumentParser(description='Generate TOML configuration file with valid licenses.')
 parser.add_argument('output', help='Output file')
 parser.add_argument('-s', '--suse', action='store_true', help='Add SUSE exceptions')
@@ -20,8 +22,7 @@ with open(args.output, 'w') as wfile:
     wfile.write('# Generated with %s script from spec-cleaner:\n' % script_name)
     wfile.write('# URL: https://github.com/rpm-software-management/spec-cleaner\n\n')
     wfile.write('ValidLicenses = [\n')
-    for line in open('data/licenses_changes.txt').readlines():
-        name = line.strip().split('\t')[0]
+    for name, _ in load_license_database().entries:
         wfile.write(f'    "{name}",\n')
     if args.suse:
         wfile.write('    # SUSE EXCEPTIONS\n')
@@ -12,8 +12,10 @@ import sys
 from datetime import datetime
 from typing import Any, Dict, List
 
+from .fileutils import STDIN
 from .rpmcleaner import RpmSpecCleaner
 from .rpmexception import RpmException, RpmWrongArgs
+from .rpmrules import RULE_NAMES
 
 __version__ = '1.2.2'
 
@@ -29,7 +31,8 @@ def process_args(argv: List[str]) -> Dict[str, Any]:
         A dict mapping arguments to the corresponding values.
 
     Raises:
-        RpmWrongArgs: If the specfile doesn't exist or
+        RpmWrongArgs: If the specfile doesn't exist,
+                      if the spec read from stdin should be inlined or diffed or
                       if the output file already exists but '--force' option (overwrite the output) wasn't used.
     """
     parser = argparse.ArgumentParser(
@@ -42,7 +45,12 @@ def process_args(argv: List[str]) -> Dict[str, Any]:
     # Make the -d, -i, and -o exclusive as we can do only one of those
     output_group = parser.add_mutually_exclusive_group()
 
-    parser.add_argument('specfile', metavar='SPEC', type=str, help='spec file to beautify')
+    parser.add_argument(
+        'specfile',
+        metavar='SPEC',
+        type=str,
+        help='spec file to beautify ("-" reads the spec from stdin and writes it to stdout).',
+    )
     parser.add_argument(
         '-c',
         '--cmake',
@@ -55,9 +63,27 @@ def process_args(argv: List[str]) -> Dict[str, Any]:
         action='store_true',
         help='run the diff program to show differences between new and original specfile.',
     )
+    parser.add_argument(
+        '--diff-format',
+        default='program',
+        choices=('program', 'unified'),
+        help='show the differences in the diff program or print them as a unified diff (a patch '
+        'applicable by "git apply" from the current directory if the spec is under it), "unified" '
+        'implies the diff option.',
+    )
     parser.add_argument(
         '--diff-prog', default='vimdiff', help='specify the diff binary to call with diff option.',
     )
+    parser.add_argument(
+        '--disable-rule',
+        action='append',
+        default=[],
+        choices=RULE_NAMES,
+        metavar='RULE',
+        help='disable the given cleanup rule, can be used multiple times (one of: {0})'.format(
+            ', '.join(RULE_NAMES)
+        ),
+    )
     parser.add_argument(
         '-f', '--force', action='store_true', help='overwrite the output file if already exist.',
     )
@@ -83,6 +109,16 @@ def process_args(argv: List[str]) -> Dict[str, Any]:
         action='store_true',
         help='do not include official SUSE copyright hear and just keep what is present',
     )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='print the table with the time spent in the phases of the cleaning to stderr.',
+    )
+    parser.add_argument(
+        '--memprofile',
+        action='store_true',
+        help='print the peak and retained memory of the phases and the top allocation sites to stderr.',
+    )
     parser.add_argument(
         '--remove-groups', action='store_true', help='remove groups from the specfile.'
     )
@@ -131,8 +167,22 @@ def process_args(argv: List[str]) -> Dict[str, Any]:
 
     options = parser.parse_args(args=argv)
 
+    # the unified diff is printed instead of the cleaned spec
+    if options.diff_format == 'unified':
+        if options.inline or options.output:
+            raise RpmWrongArgs('the unified diff can be written only to stdout.')
+        options.diff = True
+
+    # the tracing of the allocations would skew the timings
+    if options.profile and options.memprofile:
+        raise RpmWrongArgs('--profile and --memprofile can not be used together.')
+
     # the spec must exist for us to do anything
-    if not os.path.exists(options.specfile):
+    if options.specfile == STDIN:
+        # there is no file to replace or to compare with
+        if options.inline or options.diff:
+            raise RpmWrongArgs('the spec read from stdin can be written only to stdout or a file.')
+    elif not os.path.exists(options.specfile):
         raise RpmWrongArgs('{0} does not exist.'.format(options.specfile))
 
     # the path for output must exist and the file must not be there unless
@@ -1,254 +1,246 @@
 import logging
 import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
-from .rpmexception import NoMatchException
+from .rpmexception import NoMatchException, RpmException
 from .rpmrequirestoken import RpmRequiresToken
 
 chunk_types = ('text', 'space', 'macro', 'operator', 'version')
 
 state_types = ('start', 'name', 'operator', 'version')
 
-re_brackets = {}
-re_brackets['('] = re.compile(
-    r'(' + r'\(' + r'|' + r'\)' + r'|' + r'\\(' + r'|' + r'\\)' + r'|' + r'[^\()]+' + r')'
-)
+# states of the parser (indexes to state_types)
+START, NAME, OPERATOR, VERSION = range(len(state_types))
 
-re_brackets['{'] = re.compile(
-    r'(' + r'\{' + r'|' + r'\}' + r'|' + r'\\{' + r'|' + r'\\}' + r'|' + r'[^\{}]+' + r')'
-)
+# characters allowed in the names (and the versions)
+_name_chars = r'-A-Za-z0-9_~(){}@:;.+/*\[\]'
 
-re_name = re.compile(r'[-A-Za-z0-9_~(){}@:;.+/*\[\]]+')
+re_name = re.compile(r'[' + _name_chars + r']+')
 re_version = re.compile(r'[-A-Za-z0-9_~():.+]+')
 re_spaces = re.compile(r'(\s*,\s*|\s+)')
 re_macro_unbraced = re.compile('%[A-Za-z0-9_]{3,}')
 re_version_operator = re.compile('(>=|<=|=>|=<|>|<|=)')
 
+# master tokenizer, the alternatives are tried in the order of precedence of the chunk types
+re_chunk = re.compile(
+    r'(?P<operator>[<>]=|=[<>]|[<>=])'
+    r'|(?P<space>\s*,\s*|\s+)'
+    r'|(?P<escaped>%%)'
+    r'|(?P<bracketed>%[{(]|\()'
+    r'|(?P<macro>%[A-Za-z0-9_]{3,})'
+    r'|(?P<text>[' + _name_chars + r']+)'
+)
+
+# the brackets counted when looking for the end of the bracketed macro
+re_brackets = {'(': re.compile(r'[()]'), '{': re.compile(r'[{}]')}
+
+# the common values: a single name or 'name operator version' without any macro
+re_simple_dependency = re.compile(
+    r'\s*(?P<name>[' + _name_chars.replace('(', '') + r'][' + _name_chars + r']*)'
+    r'(?:\s*(?P<operator>[<>]=|=[<>]|[<>=])\s*'
+    r'(?P<version>[' + _name_chars.replace('(', '') + r'][' + _name_chars + r']*))?\s*'
+)
+
 logger = logging.getLogger('DepParser')
 # Switch to logging.DEBUG if needed
 logger.setLevel(logging.ERROR)
 
 
-def find_end_of_bracketed_macro(string, regex, opening, closing):
+def find_end_of_bracketed_macro(string, pos):
+    """
+    Find the end of the bracketed macro (or boolean dependency) starting at the given position.
+
+    Args:
+        string: A string with the parsed line.
+        pos: An int with the position of the '%{', '%(' or '(' starting the macro.
+
+    Returns:
+        An int with the position after the closing bracket.
+
+    Raises:
+        Exception if the string ends before the macro is closed.
+    """
     # ommit the initial bracket, or %bracket
-    if string.startswith('%'):
-        macro = string[0:2]
-        string = string[2:]
-    else:
-        macro = string[0:1]
-        string = string[1:]
+    if string[pos] == '%':
+        pos += 1
+    opening = string[pos]
     opened = 1
-    while opened and string:
-        try:
-            bite, string = consume_chars(regex, string)
-        except NoMatchException:
-            raise Exception('unexpected parser error when looking for end of macro')
-
-        if bite == opening:
+    for match in re_brackets[opening].finditer(string, pos + 1):
+        if match.group() == opening:
             opened += 1
-        elif bite == closing:
+        else:
             opened -= 1
-        macro += bite
-
-    if opened:
-        raise Exception('Unexpectedly met end of string when looking for end of macro')
-    return macro, string
-
-
-def consume_chars(regex, string):
-    match = regex.match(string)
-    if match:
-        end = match.end()
-        return string[0:end], string[end:]
-    else:
-        raise NoMatchException(
-            'Expected match failed (string: "%s", regex: "%s" )' % (string, regex.pattern)
-        )
+            if not opened:
+                return match.end()
+    raise Exception('Unexpectedly met end of string when looking for end of macro')
 
 
-def read_boolean(string):
-    return find_end_of_bracketed_macro(string, re_brackets['('], '(', ')')
+def read_next_chunk(string, pos):
+    """
+    Read the chunk of the string starting at the given position.
 
+    Args:
+        string: A string with the parsed line.
+        pos: An int with the position to start at.
 
-def matching_bracket(bracket):
-    if bracket == '{':
-        return '}'
-    elif bracket == '(':
-        return ')'
-    raise Exception(
-        'Undefined bracket matching - add defintion of "%s" to ' 'matching_bracket()' % bracket
-    )
+    Returns:
+        A tuple with the position after the chunk, the chunk and its type.
 
+    Raises:
+        NoMatchException if no chunk can be read there.
+    """
+    if pos >= len(string):
+        return pos, '', 'text'
 
-def read_macro(string):
-    opening = string[1]
-    closing = matching_bracket(opening)
-    return find_end_of_bracketed_macro(string, re_brackets[opening], opening, closing)
-
-
-def read_next_chunk(string):
-    chunk = ''
-    chunk_type = ''
-
-    if not string:
-        return '', '', 'text'
-
-    if string[0:2] in ('>=', '<=', '=>', '=<'):
-        chunk = string[0:2]
-        chunk_type = 'operator'
-        rest = string[2:]
-
-    elif string[0:1] in ('<', '>', '='):
-        chunk = string[0:1]
-        chunk_type = 'operator'
-        rest = string[1:]
-
-    elif string[0].isspace() or string[0] == ',':
-        chunk = ''
-        chunk_type = 'space'
-        rest = consume_chars(re_spaces, string)[1]
-
-    elif string[0:2] == '%%':
-        chunk = '%%'
-        chunk_type = 'text'
-        rest = string[2:]
-
-    elif string[0:2] in ('%{', '%('):
-        chunk, rest = read_macro(string)
-        chunk_type = 'macro'
-
-    elif string[0] == '%':
-        chunk, rest = consume_chars(re_macro_unbraced, string)
-        chunk_type = 'macro'
+    match = re_chunk.match(string, pos)
+    if not match:
+        raise NoMatchException(
+            'Expected match failed (string: "%s", regex: "%s" )'
+            % (string[pos:], (re_macro_unbraced if string[pos] == '%' else re_name).pattern)
+        )
+    kind = match.lastgroup
+    end = match.end()
+    if kind == 'operator':
+        return end, match.group(), 'operator'
+    elif kind == 'space':
+        return end, '', 'space'
+    elif kind == 'escaped' or kind == 'text':
+        return end, match.group(), 'text'
+    elif kind == 'bracketed':
+        end = find_end_of_bracketed_macro(string, pos)
+    return end, string[pos:end], 'macro'
 
-    elif string[0] == '(':
-        chunk, rest = read_boolean(string)
-        chunk_type = 'macro'
 
-    else:
-        chunk, rest = consume_chars(re_name, string)
-        chunk_type = 'text'
+class DepParserError(RpmException):
+    """Exception raised by the dependency value which can't be parsed."""
 
-    return (rest, chunk, chunk_type)
 
+class DependencyParser:
+    """
+    Split the value of the dependency tag to the dependency tokens.
 
-class DepParserError(Exception):
-    pass
+    The common values (one name or 'name operator version') are matched at once, the others are
+    read chunk by chunk, walking the position through the line, and fed to the state machine.
 
+    Attributes:
+        parsed: A list of tuples with the name, the operator and the version of the dependencies.
+    """
 
-class DependencyParser:
     def __init__(self, line):
-        # adding comma will cause flush in the end of line
-        self.string = line + ', '
         self.parsed = []
-        self.token = []
-        self.state = 'start'
-        self.space = False
-        self.token_name = ''
-        self.token_operator = None
-        self.token_version = None
-        self.go_on = True
-        while self.go_on:
-            self.string, self.next, self.next_type = read_next_chunk(self.string)
-            logger.debug(
-                """========
-                chunk: '%s'
-                chunk_type: '%s'
-                rest: '%s'
-                token: '%s'
-                parsed: '%s'""",
-                self.next,
-                self.next_type,
-                self.string,
-                self.token,
-                self.parsed,
-            )
-            self.state_change()
+        match = re_simple_dependency.fullmatch(line)
+        if match:
+            self.parsed.append(match.group('name', 'operator', 'version'))
+        else:
+            self._parse(line)
 
     def flat_out(self):
-        result = []
-        for name, operator, ver in self.parsed:
-            result.append(RpmRequiresToken(name, operator, ver))
-        return result
-
-    def flush(self):
-        self.parsed.append((self.token_name, self.token_operator, self.token_version))
-        # cleanup state
-        self.token = []
-        self.token_name = ''
-        self.token_operator = None
-        self.token_version = None
-        if not self.string:
-            self.go_on = False
-
-    def reconstitute_token(self):
-        r = ''.join(self.token)
-        logger.debug("reconstituting '%s'", r)
-        self.token = []
-        return r
-
-    def name_state_change(self):
-        if self.next_type in ['text', 'macro']:
-            if self.space:
-                logger.debug('text after space --> flush')
-                self.token_name = self.reconstitute_token()
-                self.space = False
-                self.flush()
-        elif self.next_type == 'space':
-            self.space = True
-        elif self.next_type == 'operator':
-            self.token_name = self.reconstitute_token()
-            self.state = 'operator'
-            self.space = False
-
-        self.token.append(self.next)
-
-    def operator_state_change(self):
-        if self.next_type in ['text', 'macro']:
-            self.state = 'version'
-            self.token_operator = self.reconstitute_token()
-            self.space = False
-        elif self.next_type == 'space':
-            self.space = True
-        elif self.next_type == 'operator':
-            if self.space:
-                raise DepParserError('found operator after operator')
-
-        self.token.append(self.next)
-
-    def version_state_change(self):
-        if self.next_type == 'text':
-            pass
-        elif self.next_type == 'space':
-            self.token_version = self.reconstitute_token()
-            self.flush()
-            self.state = 'name'
-            self.space = False
-        elif self.next_type == 'macro':
-            pass
-        elif self.next_type == 'operator':
-            raise DepParserError('found operator after version')
-
-        self.token.append(self.next)
-
-    def start_state_change(self):
-        if self.next_type == 'text':
-            self.state = 'name'
-        elif self.next_type == 'space':
-            pass
-        elif self.next_type == 'macro':
-            self.state = 'name'
-        elif self.next_type == 'operator':
-            raise DepParserError('found operator when name expected')
-
-        self.token.append(self.next)
-
-    def state_change(self):
-        if self.state == 'name':
-            self.name_state_change()
-        elif self.state == 'operator':
-            self.operator_state_change()
-        elif self.state == 'version':
-            self.version_state_change()
-        elif self.state == 'start':
-            self.start_state_change()
-        logger.debug('new state: %s', self.state)
+        return [RpmRequiresToken(name, operator, ver) for name, operator, ver in self.parsed]
+
+    def _parse(self, line):
+        # adding comma will cause flush in the end of line
+        string = line + ', '
+        length = len(string)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        parsed = self.parsed
+        token = []
+        state = START
+        space = False
+        name = ''
+        operator = None
+        pos = 0
+        while True:
+            at_end = pos >= length
+            pos, chunk, chunk_type = read_next_chunk(string, pos)
+            if debug:
+                logger.debug(
+                    "chunk: '%s' chunk_type: '%s' rest: '%s' token: '%s' parsed: '%s'",
+                    chunk,
+                    chunk_type,
+                    string[pos:],
+                    token,
+                    parsed,
+                )
+            flush = None
+            if state == NAME:
+                if chunk_type == 'space':
+                    space = True
+                elif chunk_type == 'operator':
+                    name = ''.join(token)
+                    token = []
+                    state = OPERATOR
+                    space = False
+                elif space:
+                    flush = (''.join(token), None, None)
+                    space = False
+            elif state == OPERATOR:
+                if chunk_type == 'space':
+                    space = True
+                elif chunk_type == 'operator':
+                    if space:
+                        raise DepParserError('found operator after operator')
+                else:
+                    operator = ''.join(token)
+                    token = []
+                    state = VERSION
+                    space = False
+            elif state == VERSION:
+                if chunk_type == 'space':
+                    flush = (name, operator, ''.join(token))
+                    state = NAME
+                    space = False
+                elif chunk_type == 'operator':
+                    raise DepParserError('found operator after version')
+            else:
+                if chunk_type == 'operator':
+                    raise DepParserError('found operator when name expected')
+                elif chunk_type != 'space':
+                    state = NAME
+
+            if flush:
+                parsed.append(flush)
+                token = []
+                name = ''
+                operator = None
+                if pos >= length:
+                    return
+            elif at_end:
+                # nothing more can come after the end of the line
+                raise DepParserError('unexpected end of dependency: "%s"' % line)
+            token.append(chunk)
+            if debug:
+                logger.debug('new state: %s', state_types[state])
+
+
+@lru_cache(maxsize=4096)
+def parse_dependencies(line: str) -> Tuple[Tuple[str, Optional[str], Optional[str]], ...]:
+    """
+    Parse the value of the dependency tag.
+
+    The same values are repeated a lot (in the preambles of the subpackages and in the specs of
+    the batch runs), so the results are kept in the LRU cache; its hit rate is printed with
+    '--profile'.
+
+    Args:
+        line: A string with the value of the dependency tag.
+
+    Returns:
+        A tuple of (name, operator, version) tuples.
+    """
+    return tuple(DependencyParser(line).parsed)
+
+
+def dependency_tokens(line: str) -> List[RpmRequiresToken]:
+    """
+    Get the dependency tokens for the value of the dependency tag.
+
+    Args:
+        line: A string with the value of the dependency tag.
+
+    Returns:
+        A list of new RpmRequiresTokens without the prefix.
+    """
+    return [
+        RpmRequiresToken(name, operator, ver) for name, operator, ver in parse_dependencies(line)
+    ]
@@ -1,13 +1,21 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
+import hashlib
+import locale
 import os
+import shutil
 import sys
 import sysconfig
-from io import StringIO
-from typing import IO
+import tempfile
+from typing import IO, List, Optional
 
 from .rpmexception import RpmException
 
+# the name of the spec read from the standard input
+STDIN = '-'
+# the size of the standard input kept in memory, the rest is spooled to a temporary file
+STDIN_SPOOL_SIZE = 1024 * 1024
+
 
 def open_datafile(name: str) -> IO[str]:
     """
@@ -41,12 +49,15 @@ def open_datafile(name: str) -> IO[str]:
     raise RpmException("File '{}' not found in datadirs".format(name))
 
 
-def open_stringio_spec(name: str) -> IO[str]:
+def open_spec(name: str) -> IO[str]:
     """
-    Open regular files with exception handling.
+    Open the spec for reading line by line.
+
+    The spec is not loaded into memory, but it can be read more times (seek(0)). The standard
+    input ('-') and the pipes are spooled to a temporary file for that.
 
     Args:
-        name: A string with the file name.
+        name: A string with the file name (or '-' for the standard input).
 
     Returns:
         A file object.
@@ -54,11 +65,212 @@ def open_stringio_spec(name: str) -> IO[str]:
     Raises:
         RpmException if the file is not readable.
     """
-    data = StringIO()
     try:
-        with open(name, mode='r') as f:
-            data.write(f.read())
-            data.seek(0, 0)
+        if name == STDIN:
+            return _spool(sys.stdin)
+        if not os.path.isfile(name):
+            # pipes and other special files can be read only once
+            with open(name, mode='r') as f:
+                return _spool(f)
+        return open(name, mode='r')
     except (IOError, UnicodeDecodeError) as error:
         raise RpmException(str(error))
-    return data
+
+
+def _spool(stream: IO[str]) -> IO[str]:
+    spool = tempfile.SpooledTemporaryFile(max_size=STDIN_SPOOL_SIZE, mode='w+')
+    shutil.copyfileobj(stream, spool)
+    spool.seek(0, 0)
+    return spool  # type: ignore
+
+
+class SpecWriter(object):
+    """
+    Buffered output of the cleaned spec.
+
+    The written text is collected and handed to the underlying file in large chunks. When the
+    output goes to a path (inline or '-o' mode) it is written to a temporary file in the same
+    directory which replaces the target only once the whole spec is written (see 'commit'), so
+    the target is never left truncated or half written if the run fails or is killed. The written
+    data are hashed on the way, so the target is not touched at all if the output is identical
+    to it.
+
+    Attributes:
+        name: A string with the name of the file the text is written to.
+        path: A string with the path replaced by the output on commit (or None).
+        buffer_size: An int with the number of characters collected before they are written.
+        encoding: A string with the encoding of the underlying file (used for hashing the data).
+        unchanged: A flag indicating whether the committed output was identical to the target.
+        _stream: The underlying file object.
+        _buffer: A list of the strings not written yet.
+        _buffered: An int with the length of the buffered text.
+        _digest: A hash object of the data written to the file replacing the path.
+        _size: An int with the number of bytes written to the file replacing the path.
+    """
+
+    def __init__(
+        self,
+        stream: IO[str],
+        path: Optional[str] = None,
+        name: Optional[str] = None,
+        buffer_size: int = 65536,
+        encoding: Optional[str] = None,
+    ) -> None:
+        """
+        Wrap the stream.
+
+        Args:
+            stream: The file object to write to.
+            path: A string with the path replaced by the output on commit (or None).
+            name: A string with the name of the output (the name of the stream by default).
+            buffer_size: An int with the number of characters collected before they are written.
+            encoding: A string with the encoding of the stream (the locale one by default).
+        """
+        self._stream = stream
+        self.name = name or stream.name
+        self.path = path
+        self.buffer_size = buffer_size
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self.unchanged = False
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._digest = hashlib.sha256()
+        self._size = 0
+
+    @classmethod
+    def open(cls, path: str) -> 'SpecWriter':
+        """
+        Create the writer replacing the given file.
+
+        If the path is a symlink, the file it points to is replaced and the symlink is kept.
+
+        Args:
+            path: A string with the path of the output file.
+
+        Returns:
+            The SpecWriter writing to a temporary file next to the path.
+
+        Raises:
+            RpmException if the temporary file can't be created.
+        """
+        target = os.path.realpath(path)
+        directory, filename = os.path.split(target)
+        try:
+            fd, name = tempfile.mkstemp(prefix='.' + filename + '.', suffix='.tmp', dir=directory)
+        except OSError as error:
+            raise RpmException(str(error))
+        # the replaced file keeps its permissions (and the owner if we are allowed to set it),
+        # the new one gets the default ones
+        try:
+            target_stat = os.stat(target)
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(name, 0o666 & ~umask)
+        else:
+            try:
+                os.chown(name, target_stat.st_uid, target_stat.st_gid)
+            except OSError:
+                pass
+            os.chmod(name, target_stat.st_mode & 0o7777)
+        encoding = locale.getpreferredencoding(False)
+        return cls(os.fdopen(fd, 'w', encoding=encoding), target, name, encoding=encoding)
+
+    def write(self, text: str) -> None:
+        """
+        Add the text to the output.
+
+        Args:
+            text: A string to write.
+        """
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def write_lines(self, lines: List[str]) -> None:
+        """
+        Add the lines to the output (the newlines are added to them).
+
+        Args:
+            lines: A list of the lines without the newlines.
+        """
+        if lines:
+            self.write('\n'.join(lines) + '\n')
+
+    def flush(self) -> None:
+        """Write the buffered text to the underlying file."""
+        if self._buffer:
+            text = ''.join(self._buffer)
+            self._stream.write(text)
+            if self.path:
+                data = text.encode(self.encoding)
+                self._digest.update(data)
+                self._size += len(data)
+            self._buffer = []
+            self._buffered = 0
+        self._stream.flush()
+
+    def getvalue(self) -> str:
+        """Get the text written to the in-memory stream."""
+        self.flush()
+        return self._stream.getvalue()  # type: ignore
+
+    def commit(self) -> None:
+        """
+        Finish the output.
+
+        The buffered text is written and if the output replaces a file, it is moved in its place.
+        The file is left untouched (and the output dropped) if it has the same content.
+
+        Raises:
+            RpmException if the file can't be replaced.
+        """
+        self.flush()
+        if self.path:
+            self._stream.close()
+            if self._same_as_target():
+                target = self.path
+                self.unchanged = True
+                self.discard()
+                self.name = target
+                return
+            try:
+                os.replace(self.name, self.path)
+            except OSError as error:
+                self.discard()
+                raise RpmException(str(error))
+            self.name = self.path
+            self.path = None
+
+    def _same_as_target(self) -> bool:
+        """Check whether the target file has the same content as the written output."""
+        path = self.path
+        if not path:
+            return False
+        try:
+            if os.stat(path).st_size != self._size:
+                return False
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(65536), b''):
+                    digest.update(block)
+        except OSError:
+            return False
+        return digest.digest() == self._digest.digest()
+
+    def discard(self) -> None:
+        """Drop the temporary file if the output was not committed."""
+        if self.path:
+            self._stream.close()
+            try:
+                os.unlink(self.name)
+            except OSError:
+                pass
+            self.path = None
+
+    def close(self) -> None:
+        """Close the underlying file, the uncommitted output replacing a file is discarded."""
+        self.discard()
+        self._buffer = []
+        self._stream.close()
@@ -0,0 +1,271 @@
+# vim: set ts=4 sw=4 et: coding=UTF-8
+
+"""Parser of the SPDX license expressions used in the License tags."""
+
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Tuple, Union
+
+from .fileutils import open_datafile
+
+LICENSES_CHANGES = 'licenses_changes.txt'
+LICENSES_EXCEPTIONS = 'licenses_exceptions.txt'
+
+# license ; should be replaced by ands
+RE_LICENSE_SEMICOLON = re.compile(r'\s*;\s*')
+# split using 'or', 'and' and parenthesis
+RE_LICENSE_SPLIT = re.compile(r'(\(|\)| and | AND | OR | or (?!later)|;)')
+# the license with the exception
+RE_LICENSE_WITH = re.compile(r' (?:with|WITH) ')
+
+OPERATORS = {'and': 'AND', 'AND': 'AND', 'or': 'OR', 'OR': 'OR'}
+# words which can't start or end the license name
+OPERATOR_WORDS = frozenset(('and', 'or', 'with'))
+
+
+class LicenseParseError(Exception):
+    """Exception raised by the license expression which is not well formed."""
+
+
+class License(NamedTuple):
+    """
+    The license identifier (or the free text naming the license).
+
+    Attributes:
+        name: A string with the name as written (with the whitespace normalized).
+    """
+
+    name: str
+
+    @property
+    def plus(self) -> bool:
+        """Whether the license has the '+' (or later) suffix."""
+        return self.name.endswith('+')
+
+    @property
+    def base(self) -> str:
+        """The name without the '+' suffix."""
+        return self.name[:-1] if self.plus else self.name
+
+
+class WithException(NamedTuple):
+    """
+    The license with the exception (e.g. 'GPL-2.0-or-later WITH Classpath-exception-2.0').
+
+    Attributes:
+        license: The License.
+        exception: A string with the name of the exception.
+        name: A string with the whole expression as written.
+    """
+
+    license: License
+    exception: str
+    name: str
+
+
+class Group(NamedTuple):
+    """
+    The parenthesized expression.
+
+    Attributes:
+        expression: The expression in the parentheses.
+    """
+
+    expression: 'Expression'
+
+
+class Compound(NamedTuple):
+    """
+    The operands joined by the operator.
+
+    Attributes:
+        operator: 'AND' or 'OR'.
+        operands: A tuple of the expressions joined by the operator.
+    """
+
+    operator: str
+    operands: Tuple['Expression', ...]
+
+
+Expression = Union[License, WithException, Group, Compound]
+
+
+class LicenseDatabase(NamedTuple):
+    """
+    The known licenses and exceptions.
+
+    Attributes:
+        entries: A tuple of (correct, old) tuples in the order of the licenses_changes.txt file.
+        licenses: A frozenset of the correct license expressions (interned).
+        exceptions: A frozenset of the SPDX exceptions (interned).
+    """
+
+    entries: Tuple[Tuple[str, str], ...]
+    licenses: FrozenSet[str]
+    exceptions: FrozenSet[str]
+
+
+@lru_cache(maxsize=None)
+def load_license_database() -> LicenseDatabase:
+    """
+    Read the known licenses and exceptions from the data files.
+
+    Returns:
+        The LicenseDatabase.
+    """
+    with open_datafile(LICENSES_CHANGES) as f:
+        entries = tuple(
+            (sys.intern(correct), old)
+            for correct, old in (line.rstrip('\n').split('\t') for line in f)
+        )
+    with open_datafile(LICENSES_EXCEPTIONS) as f:
+        exceptions = frozenset(sys.intern(line.strip()) for line in f if line.strip())
+    return LicenseDatabase(entries, frozenset(correct for correct, _ in entries), exceptions)
+
+
+def tokenize_license(value: str) -> List[str]:
+    """
+    Split the license expression to the operators, parentheses and license names.
+
+    Args:
+        value: A string with the license expression.
+
+    Returns:
+        A list of the tokens with the whitespace normalized (the tokens of just whitespace are
+        empty strings).
+    """
+    value = RE_LICENSE_SEMICOLON.sub(' and ', value.rstrip(';'))
+    tokens = []
+    for token in RE_LICENSE_SPLIT.split(value):
+        if token != '':
+            token = ' '.join(token.split())
+            tokens.append(token.replace('ORlater', 'or later').replace('ORsim', 'or similar'))
+    return tokens
+
+
+class _LicenseParser(object):
+    """Recursive descent parser of the tokens (AND binds tighter than OR)."""
+
+    def __init__(self, tokens: List[str], exceptions: FrozenSet[str]) -> None:
+        self.tokens = tokens
+        self.exceptions = exceptions
+        self.pos = 0
+
+    def parse(self) -> 'Expression':
+        expression = self._compound('OR')
+        if self.pos != len(self.tokens):
+            raise LicenseParseError('unexpected "%s"' % self.tokens[self.pos])
+        return expression
+
+    def _compound(self, operator: str) -> 'Expression':
+        parse_operand = self._primary if operator == 'AND' else lambda: self._compound('AND')
+        operands = [parse_operand()]
+        while self.pos < len(self.tokens) and OPERATORS.get(self.tokens[self.pos]) == operator:
+            self.pos += 1
+            operands.append(parse_operand())
+        if len(operands) == 1:
+            return operands[0]
+        return Compound(operator, tuple(operands))
+
+    def _primary(self) -> 'Expression':
+        if self.pos >= len(self.tokens):
+            raise LicenseParseError('unexpected end of license')
+        token = self.tokens[self.pos]
+        self.pos += 1
+        if token == '(':
+            expression = self._compound('OR')
+            if self.pos >= len(self.tokens) or self.tokens[self.pos] != ')':
+                raise LicenseParseError('missing ")"')
+            self.pos += 1
+            return Group(expression)
+        if token == ')' or token in OPERATORS:
+            raise LicenseParseError('unexpected "%s"' % token)
+        words = token.lower().split()
+        if not words or words[0] in OPERATOR_WORDS or words[-1] in OPERATOR_WORDS:
+            raise LicenseParseError('unexpected license name "%s"' % token)
+        parts = RE_LICENSE_WITH.split(token)
+        if len(parts) == 2 and parts[1] in self.exceptions:
+            return WithException(License(_intern(parts[0])), parts[1], token)
+        return License(_intern(token))
+
+
+def _intern(name: str) -> str:
+    if name in load_license_database().licenses:
+        return sys.intern(name)
+    return name
+
+
+@lru_cache(maxsize=1024)
+def parse_license(value: str) -> 'Expression':
+    """
+    Parse the license expression.
+
+    The names which are not SPDX identifiers are kept as they are, so the old license names
+    (e.g. 'GPLv2 or later') can be converted afterwards.
+
+    Args:
+        value: A string with the license expression (e.g. 'GPL-2.0+ and (MIT or BSD-3-Clause)').
+
+    Returns:
+        The expression tree.
+
+    Raises:
+        LicenseParseError if the expression is not well formed.
+    """
+    tokens = tokenize_license(value)
+    if not tokens:
+        raise LicenseParseError('empty license')
+    return _LicenseParser(tokens, load_license_database().exceptions).parse()
+
+
+def _render(expression: 'Expression', conversions: Dict[str, str], tokens: List[str]) -> None:
+    if isinstance(expression, Compound):
+        _render(expression.operands[0], conversions, tokens)
+        for operand in expression.operands[1:]:
+            tokens.append(expression.operator)
+            _render(operand, conversions, tokens)
+    elif isinstance(expression, Group):
+        tokens.append('(')
+        _render(expression.expression, conversions, tokens)
+        tokens.append(')')
+    else:
+        # the license with the exception is converted as a whole (the license alone is left
+        # as it is, eg. 'GPL-3.0 WITH GCC-exception-3.1')
+        tokens.append(conversions.get(expression.name, expression.name))
+
+
+def normalize_license(expression: 'Expression', conversions: Dict[str, str]) -> str:
+    """
+    Render the expression with the old license names converted.
+
+    Args:
+        expression: The expression tree.
+        conversions: A dict mapping the old license names to the SPDX ones.
+
+    Returns:
+        A string with the license.
+    """
+    tokens: List[str] = []
+    _render(expression, conversions, tokens)
+    return join_license(tokens)
+
+
+def join_license(tokens: List[str]) -> str:
+    """
+    Join the license tokens and normalize the spaces and operators.
+
+    Args:
+        tokens: A list of the tokens.
+
+    Returns:
+        A string with the license.
+    """
+    return (
+        ' '.join(tokens)
+        .replace('( ', '(')
+        .replace(' )', ')')
+        .replace(' and ', ' AND ')
+        .replace(' or ', ' OR ')
+        .replace(' with ', ' WITH ')
+    )
@@ -0,0 +1,389 @@
+# vim: set ts=4 sw=4 et: coding=UTF-8
+
+"""Time and memory spent in the phases of the cleaning (the '--profile' and '--memprofile')."""
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class PhaseStats(object):
+    """
+    Statistics of one phase.
+
+    Attributes:
+        calls: An int with the number of times the phase was run.
+        seconds: A float with the cumulative time of the phase (including the nested phases).
+        exclusive: A float with the cumulative time of the phase without the nested phases.
+        lines: An int with the number of the lines processed in the phase.
+        peak: An int with the highest number of bytes allocated in one run of the phase
+              ('--memprofile' only).
+        retained: An int with the number of bytes allocated in the phase and still not freed
+                  at its end, summed over all its runs ('--memprofile' only).
+    """
+
+    __slots__ = ('calls', 'seconds', 'exclusive', 'lines', 'peak', 'retained')
+
+    def __init__(self) -> None:
+        """Start with no calls."""
+        self.calls = 0
+        self.seconds = 0.0
+        self.exclusive = 0.0
+        self.lines = 0
+        self.peak = 0
+        self.retained = 0
+
+
+class Profiler(object):
+    """
+    Collect the call counts, the cumulative time and the processed lines of the phases.
+
+    The phases are reported in the order they were first run, followed by the hits and misses
+    of the tracked caches. Both the inclusive time of a phase (with the phases nested in it) and
+    its exclusive time (without them) are reported, the percentage is of the exclusive time, so
+    the phases sum up to at most 100 %.
+
+    It is also the interface of the NullProfiler and the MemoryProfiler, so the cleaner uses
+    them interchangeably.
+
+    Attributes:
+        phases: A dict mapping the names of the phases to their PhaseStats.
+        caches: A dict mapping the names of the tracked caches to the functions wrapped by
+                functools.lru_cache and their cache_info() when the tracking started.
+        _start: A float with the time the profiler was created.
+        _nested: A list of the time spent in the finished nested phases of the running phases
+                 (the first item is the whole run).
+    """
+
+    def __init__(self) -> None:
+        """Start the clock of the whole run."""
+        self.phases: Dict[str, PhaseStats] = {}
+        self.caches: Dict[str, Tuple[Any, Any]] = {}
+        self._start = time.perf_counter()
+        self._nested: List[float] = [0.0]
+
+    def stats(self, name: str) -> PhaseStats:
+        """
+        Get the statistics of the phase (they are created if needed).
+
+        Args:
+            name: A string with the name of the phase.
+
+        Returns:
+            The PhaseStats of the phase.
+        """
+        if name not in self.phases:
+            self.phases[name] = PhaseStats()
+        return self.phases[name]
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        """
+        Time the phase run in the with block.
+
+        Args:
+            name: A string with the name of the phase.
+
+        Yields:
+            The PhaseStats of the phase, so the processed lines can be added to them.
+        """
+        stats = self.stats(name)
+        stats.calls += 1
+        start = self._enter()
+        try:
+            yield stats
+        finally:
+            self._leave(stats, start)
+
+    def wrap(self, function: Callable[..., Any], name: str, counts_lines: bool = False):
+        """
+        Time all the calls of the function.
+
+        Args:
+            function: The function to time.
+            name: A string with the name of the phase.
+            counts_lines: A flag indicating whether each call processes one line.
+
+        Returns:
+            The wrapped function.
+        """
+        stats = self.stats(name)
+
+        def timed(*args, **kwargs):
+            stats.calls += 1
+            if counts_lines:
+                stats.lines += 1
+            start = self._enter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._leave(stats, start)
+
+        return timed
+
+    def _enter(self) -> float:
+        """Start timing the phase, return the time it started."""
+        self._nested.append(0.0)
+        return time.perf_counter()
+
+    def _leave(self, stats: PhaseStats, start: float) -> None:
+        """Add the time of the finished phase to its statistics and to the enclosing phase."""
+        elapsed = time.perf_counter() - start
+        stats.seconds += elapsed
+        stats.exclusive += elapsed - self._nested.pop()
+        self._nested[-1] += elapsed
+
+    def track_cache(self, name: str, function: Any) -> None:
+        """
+        Report the hits and misses of the cache of the function made from now on.
+
+        The caches live for the whole process, so only the difference is reported.
+
+        Args:
+            name: A string with the name of the cache in the report.
+            function: The function wrapped by functools.lru_cache.
+        """
+        self.caches[name] = (function, function.cache_info())
+
+    def _report_caches(self, stream: IO[str]) -> None:
+        """Print the table of the tracked caches."""
+        if not self.caches:
+            return
+        stream.write(
+            '\n{0:40} {1:>8} {2:>8} {3:>6} {4:>8}\n'.format('cache', 'hits', 'misses', '%', 'size')
+        )
+        for name, (function, start) in self.caches.items():
+            info = function.cache_info()
+            hits = info.hits - start.hits
+            misses = info.misses - start.misses
+            stream.write(
+                '{0:40} {1:>8} {2:>8} {3:>6.1f} {4:>8}\n'.format(
+                    name,
+                    hits,
+                    misses,
+                    hits / (hits + misses) * 100 if hits + misses else 0,
+                    info.currsize,
+                )
+            )
+
+    def instrument_section(self, section: Any) -> None:
+        """
+        Time the reading, the processing and the output of the section object.
+
+        The batched sections only store the lines while reading them and process them all in
+        'flush' (called by the output), so the processing of the lines ('add') and the flush are
+        timed as the phases of their own.
+
+        Args:
+            section: The Section object.
+        """
+        name = type(section).__name__
+        section.read = self.wrap(section.read, name + '.read', counts_lines=True)
+        section.add = self.wrap(section.add, name + '.add', counts_lines=True)
+        if section.batched:
+            section.flush = self.wrap(section.flush, name + '.flush')
+        section.output = self.wrap(section.output, name + '.output')
+
+    def report(self, stream: Optional[IO[str]] = None) -> None:
+        """
+        Print the table of the phases.
+
+        Args:
+            stream: A file object to print the table to (stderr by default).
+        """
+        stream = stream or sys.stderr
+        total = time.perf_counter() - self._start
+        stream.write(
+            '{0:40} {1:>8} {2:>10} {3:>10} {4:>6} {5:>8}\n'.format(
+                'phase', 'calls', 'inclusive', 'exclusive', '%', 'lines'
+            )
+        )
+        for name, stats in self.phases.items():
+            if not stats.calls:
+                continue
+            stream.write(
+                '{0:40} {1:>8} {2:>10.4f} {3:>10.4f} {4:>6.1f} {5:>8}\n'.format(
+                    name,
+                    stats.calls,
+                    stats.seconds,
+                    stats.exclusive,
+                    stats.exclusive / total * 100 if total else 0,
+                    stats.lines or '',
+                )
+            )
+        outside = total - self._nested[0]
+        stream.write(
+            '{0:40} {1:>8} {2:>10} {3:>10.4f} {4:>6.1f}\n'.format(
+                'outside of the phases', '', '', outside, outside / total * 100 if total else 0
+            )
+        )
+        stream.write('{0:40} {1:>8} {2:>10.4f}\n'.format('total', '', total))
+        self._report_caches(stream)
+
+
+class NullProfiler(Profiler):
+    """Profiler doing nothing, used when the profiling is not enabled."""
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        """Run the with block with throwaway statistics."""
+        yield PhaseStats()
+
+    def wrap(self, function: Callable[..., Any], name: str, counts_lines: bool = False):
+        """Return the function unchanged."""
+        return function
+
+    def track_cache(self, name: str, function: Any) -> None:
+        """Ignore the cache."""
+
+    def instrument_section(self, section: Any) -> None:
+        """Leave the section untouched."""
+
+    def report(self, stream: Optional[IO[str]] = None) -> None:
+        """Print nothing."""
+
+
+class MemoryProfiler(Profiler):
+    """
+    Collect the peak and the retained allocations of the phases by tracemalloc.
+
+    The section classes are reported as the phases of their reading and output, like in the
+    Profiler. The peak of a phase includes its nested phases. On Python older than 3.9
+    tracemalloc can't reset its peak, so the peak of a phase is known only when the phase
+    raised the peak of the whole run (otherwise the retained allocations are used).
+
+    The peak is the maximum of the runs of the phase, while the retained allocations are the
+    sum of them, so a phase run many times can retain more than its peak.
+
+    Attributes:
+        top: An int with the number of the allocation sites to report.
+        _stack: A list of [allocated bytes at the start, highest peak of the finished nested
+                phases, peak of the whole run at the start] of the running phases (the first one
+                is the whole run).
+        _started: A flag indicating whether the tracing was started by this profiler.
+        _resets_peak: A flag indicating whether tracemalloc can reset its peak.
+    """
+
+    def __init__(self, top: int = 10) -> None:
+        """
+        Start the tracing unless it is already running.
+
+        Args:
+            top: An int with the number of the allocation sites to report.
+        """
+        super().__init__()
+        self.top = top
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        self._resets_peak = hasattr(tracemalloc, 'reset_peak')
+        current, peak = tracemalloc.get_traced_memory()
+        self._stack = [[current, 0, peak]]
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        """
+        Time and trace the allocations of the phase run in the with block.
+
+        Args:
+            name: A string with the name of the phase.
+
+        Yields:
+            The PhaseStats of the phase, so the processed lines can be added to them.
+        """
+        stats = self.stats(name)
+        stats.calls += 1
+        current, peak = tracemalloc.get_traced_memory()
+        if self._resets_peak:
+            # the peak so far belongs to the enclosing phase
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+        self._stack.append([current, 0, peak])
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - start
+            peak = self._pop_peak()
+            start_bytes = self._stack.pop()[0]
+            stats.peak = max(stats.peak, peak - start_bytes)
+            stats.retained += tracemalloc.get_traced_memory()[0] - start_bytes
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+
+    def _pop_peak(self) -> int:
+        """Get the peak of the innermost running phase."""
+        current, peak = tracemalloc.get_traced_memory()
+        _, nested_peak, peak_at_start = self._stack[-1]
+        if self._resets_peak or peak > peak_at_start:
+            return max(peak, nested_peak)
+        # the peak of the whole run was reached before the phase
+        return max(current, nested_peak)
+
+    def wrap(self, function: Callable[..., Any], name: str, counts_lines: bool = False):
+        """
+        Trace the allocations of all the calls of the function.
+
+        Args:
+            function: The function to trace.
+            name: A string with the name of the phase.
+            counts_lines: A flag indicating whether each call processes one line.
+
+        Returns:
+            The wrapped function.
+        """
+
+        def traced(*args, **kwargs):
+            with self.phase(name) as stats:
+                if counts_lines:
+                    stats.lines += 1
+                return function(*args, **kwargs)
+
+        return traced
+
+    def report(self, stream: Optional[IO[str]] = None) -> None:
+        """
+        Print the table of the phases and the top allocation sites and stop the tracing.
+
+        Args:
+            stream: A file object to print the report to (stderr by default).
+        """
+        stream = stream or sys.stderr
+        if not tracemalloc.is_tracing():
+            return
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        )
+        current = tracemalloc.get_traced_memory()[0]
+        peak = self._pop_peak()
+        if self._started:
+            tracemalloc.stop()
+
+        stream.write(
+            '{0:40} {1:>8} {2:>12} {3:>16} {4:>8}\n'.format(
+                'phase', 'calls', 'max peak KiB', 'sum retained KiB', 'lines'
+            )
+        )
+        for name, stats in self.phases.items():
+            if not stats.calls:
+                continue
+            stream.write(
+                '{0:40} {1:>8} {2:>12.1f} {3:>16.1f} {4:>8}\n'.format(
+                    name, stats.calls, stats.peak / 1024, stats.retained / 1024, stats.lines or '',
+                )
+            )
+        stream.write(
+            '{0:40} {1:>8} {2:>12.1f} {3:>16.1f}\n'.format(
+                'total', '', (peak - self._stack[0][0]) / 1024, (current - self._stack[0][0]) / 1024
+            )
+        )
+        self._report_caches(stream)
+        stream.write('\ntop {0} allocation sites (retained)\n'.format(self.top))
+        for statistic in snapshot.statistics('lineno')[: self.top]:
+            frame = statistic.traceback[0]
+            stream.write(
+                '{0:>10.1f} KiB {1:>8} blocks  {2}:{3}\n'.format(
+                    statistic.size / 1024, statistic.count, frame.filename, frame.lineno
+                )
+            )
@@ -1,33 +1,43 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
 # We basically extend rpmcheck
+from typing import Optional
+
 from .rpmcheck import RpmCheck
 
 
 class RpmBuild(RpmCheck):
     """A class providing methods for %build section cleaning."""
 
-    def add(self, line: str) -> None:
-        # we do not want to run suseupdateconfig, deprecated
-        if self.reg.re_suseupdateconfig.search(line):
-            return
+    def _remove_suse_update_config(self, line: str) -> Optional[str]:
+        """
+        Drop the suse_update_config call as it is deprecated.
 
-        # if user uses cmake/configure directly just recommend him using the macros
-        if not self.minimal:
-            self._comment_macro_calls(line)
+        Args:
+            line: A string representing a line to process.
 
-        RpmCheck.add(self, line)
+        Returns:
+            The line or None if it should be dropped.
+        """
+        if self.reg.re_suseupdateconfig.search(line):
+            return None
+        return line
 
-    def _comment_macro_calls(self, line: str) -> None:
+    def _comment_macro_calls(self, line: str) -> str:
         """
         Add a comment if the package uses direct call of build tools instead of macro.
 
+        If user uses cmake/configure directly we just recommend him using the macros.
+
         Args:
             line: A string representing a line to process.
+
+        Returns:
+            The unchanged line.
         """
         # if the line itself is comment then we do not add any fixme on top of them
         if self.reg.re_comment.match(line):
-            return
+            return line
         # otherwise process the fixes
         if self.reg.re_configure.match(line):
             msg = '# FIXME: you should use the %%configure macro'
@@ -38,7 +48,7 @@ class RpmBuild(RpmCheck):
         elif self.reg.re_qmake5.match(line):
             msg = '# FIXME: you should use the %%qmake5 macro'
         else:
-            return
+            return line
 
         position = len(self.lines)
         if self.previous_line and self.previous_line.endswith('\\'):
@@ -54,3 +64,4 @@ class RpmBuild(RpmCheck):
         # if not add our message
         if not self.lines[position - 1].startswith('#'):
             self.lines.insert(position, msg)
+        return line
@@ -10,18 +10,19 @@ class RpmCheck(Section):
     Replace various troublemakers in check phase.
     """
 
-    def add(self, line: str) -> None:
-        line = self._complete_cleanup(line)
+    batched = True
 
-        # smp_mflags for jobs macro replacement
-        line = self.reg.re_jobs.sub('%{?_smp_mflags}', line)
+    def _replace_jobs(self, line: str) -> str:
+        """
+        Replace various jobs macros with %{?_smp_mflags}.
 
-        if not self.minimal:
-            line = self._replace_pytest(line)
-            line = self._replace_unittest(line)
-            line = self._replace_make(line)
+        Args:
+            line: A string representing a line to process.
 
-        Section.add(self, line)
+        Return:
+            The processed line.
+        """
+        return self.reg.re_jobs.sub('%{?_smp_mflags}', line)
 
     def _replace_pytest(self, line: str) -> str:
         """
@@ -1,13 +1,19 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
+import difflib
+import io
 import os.path
 import shlex
+import shutil
 import subprocess
 import sys
 import tempfile
-from typing import IO, Any, Dict, List, Optional, Type
+from typing import Any, Dict, List, Optional, Type
 
-from .fileutils import open_stringio_spec
+from .dependency_parser import parse_dependencies
+from .fileutils import STDIN, SpecWriter, open_spec
+from .license_parser import parse_license
+from .profiler import MemoryProfiler, NullProfiler, Profiler
 from .rpmbuild import RpmBuild
 from .rpmcheck import RpmCheck
 from .rpmcopyright import RpmCopyright
@@ -15,8 +21,8 @@ from .rpmdescription import RpmDescription
 from .rpmexception import RpmException
 from .rpmfiles import RpmFiles
 from .rpmhelpers import (
-    find_macros_with_arg,
     load_keywords_whitelist,
+    merge_conversions,
     parse_rpm_showrc,
     read_cmake_changes,
     read_group_changes,
@@ -31,6 +37,8 @@ from .rpmpreamble import RpmPreamble
 from .rpmprep import RpmPrep
 from .rpmprune import RpmChangelog, RpmClean
 from .rpmregexp import Regexp
+from .rpmrequirestoken import RpmRequiresToken
+from .rpmrules import RuleRegistry
 from .rpmscriplets import RpmScriptlets
 from .rpmsection import Section
 
@@ -46,14 +54,17 @@ class RpmSpecCleaner(object):
 
     Attributes:
         specfile: A string with the path to the specfile to process.
-        fin: An in-memory input stream with the input file data.
-        fout: A file object representing output file.
+        fin: An input stream with the input file data (it is read line by line).
+        fout: A SpecWriter with the output of the cleaning.
         current_section: A Section object representing current section of spec file.
         skip_run: A bool indicating whether the cleaning of the specfile should be
                  skipped.
         options: A dictionary holding both spec-cleaner commandline arguments and
                  auxiliary options.
         reg: A Regexp object that holds all regexps that will be used in spec-cleaner.
+        profiler: A Profiler timing the phases of the cleaning with '--profile', a MemoryProfiler
+                  measuring their allocations with '--memprofile' and NullProfiler otherwise.
+        rules: A RuleRegistry object with the cleanup rules compiled for the given options.
         section_starts: A list of tuples where the first item is regex object
                        representing a start of the specfile section and the second is
                        a corresponding class that should handle it.
@@ -65,6 +76,7 @@ class RpmSpecCleaner(object):
 
     specfile: Optional[str] = None
     current_section: Section
+    profiler: Profiler
     skip_run: bool = False
     _previous_line: Optional[str] = None
     _previous_nonempty_line: Optional[str] = None
@@ -76,40 +88,63 @@ class RpmSpecCleaner(object):
             options: A dictionary holding spec-cleaner command line options.
         """
         self.options = options
+        if self.options.get('memprofile'):
+            self.profiler = MemoryProfiler()
+        elif self.options.get('profile'):
+            self.profiler = Profiler()
+        else:
+            self.profiler = NullProfiler()
+        self.options['profiler'] = self.profiler
+        self.profiler.track_cache('parse_dependencies', parse_dependencies)
+        self.profiler.track_cache('RpmRequiresToken._format_name', RpmRequiresToken._format_name)
+        self.profiler.track_cache('parse_license', parse_license)
 
         # Initialize main license and subpkg option
         self.options['license'] = None
         self.options['subpkglicense'] = False
 
+        # Collect what needs to be known about the whole spec before it is cleaned
+        self.fin = open_spec(self.options['specfile'])
+        with self.profiler.phase('pre-scan') as stats:
+            stats.lines += self._scan_spec()
+
         # Compile keywords for unbracing
         self.options['unbrace_keywords'] = self._unbrace_keywords()
 
         # Load all the remaining file operations
-        self.options['tex_conversions'] = []
-        self.options['pkgconfig_conversions'] = []
-        self.options['cmake_conversions'] = []
-        self.options['perl_conversions'] = []
-        if self.options['tex']:
-            self.options['tex_conversions'] = read_tex_changes()
-        if self.options['pkgconfig']:
-            self.options['pkgconfig_conversions'] = read_pkgconfig_changes()
-        if self.options['cmake']:
-            self.options['cmake_conversions'] = read_cmake_changes()
-        if self.options['perl']:
-            self.options['perl_conversions'] = read_perl_changes()
-        self.options['license_conversions'] = read_licenses_changes()
-        if self.options['remove_groups']:
-            self.options['allowed_groups'] = None
-        else:
-            self.options['allowed_groups'] = read_group_changes()
-        self.options['reg'] = Regexp(self.options['unbrace_keywords'])
+        with self.profiler.phase('load data'):
+            self.options['tex_conversions'] = []
+            self.options['pkgconfig_conversions'] = []
+            self.options['cmake_conversions'] = []
+            self.options['perl_conversions'] = []
+            if self.options['tex']:
+                self.options['tex_conversions'] = read_tex_changes()
+            if self.options['pkgconfig']:
+                self.options['pkgconfig_conversions'] = read_pkgconfig_changes()
+            if self.options['cmake']:
+                self.options['cmake_conversions'] = read_cmake_changes()
+            if self.options['perl']:
+                self.options['perl_conversions'] = read_perl_changes()
+            # enabled conversions merged in descending priority (first come first serve)
+            self.options['dependency_conversions'] = merge_conversions(
+                (brackety, self.options[brackety + '_conversions'])
+                for brackety in ('pkgconfig', 'perl', 'tex', 'cmake')
+                if self.options[brackety]
+            )
+            self.options['license_conversions'] = read_licenses_changes()
+            if self.options['remove_groups']:
+                self.options['allowed_groups'] = None
+            else:
+                self.options['allowed_groups'] = read_group_changes()
+            with self.profiler.phase('Regexp catalogue'):
+                self.options['reg'] = Regexp(self.options['unbrace_keywords'])
 
         # If gvim is used for the diff then run it in foreground mode
         if self.options['diff_prog'].startswith('gvim') and ' -f' not in self.options['diff_prog']:
             self.options['diff_prog'] += ' -f'
 
         self.reg = self.options['reg']
-        self.fin = open_stringio_spec(self.options['specfile'])
+        self.rules = self.options['rules'] = RuleRegistry(self.options)
 
         # Section starts detection
         self.section_starts = [
@@ -126,11 +161,11 @@ class RpmSpecCleaner(object):
             (self.reg.re_spec_changelog, RpmChangelog),
         ]
 
-        # Find all the present licenses
-        self._load_licenses()
-
-        # Determine if we need to skip the spec ('#nospeccleaner' tag)
-        self._find_skip_parser()
+        # Compile the rules of all the sections up front
+        self.rules.compile(
+            [Section, RpmCopyright, RpmPreamble]
+            + [newclass for (_, newclass) in self.section_starts]
+        )
 
         # Set what will be the output of the cleaning
         self._select_mode()
@@ -140,69 +175,96 @@ class RpmSpecCleaner(object):
         Set up what will be the output of the cleaning process.
 
         Based on the options given to the commandline possible options are: output file, inline or a diff program
-        showing differences.
+        showing differences. The output and inline files are replaced only when the whole spec is
+        written.
         """
-        self.fout: IO[Any]
+        self.fout: SpecWriter
         if self.options['output']:
-            self.fout = open(self.options['output'], 'w')
+            self.fout = SpecWriter.open(self.options['output'])
         elif self.options['inline']:
-            self.fout = open(self.options['specfile'], 'w')
+            self.fout = SpecWriter.open(self.options['specfile'])
+        elif self.options['diff'] and self.options['diff_format'] == 'unified':
+            self.fout = SpecWriter(io.StringIO(), name=self.options['specfile'])
         elif self.options['diff']:
-            self.fout = tempfile.NamedTemporaryFile(
-                mode='w+', prefix=os.path.split(self.options['specfile'])[-1] + '.', suffix='.spec',
+            self.fout = SpecWriter(
+                tempfile.NamedTemporaryFile(
+                    mode='w+',
+                    prefix=os.path.split(self.options['specfile'])[-1] + '.',
+                    suffix='.spec',
+                )
             )
         else:
-            self.fout = sys.stdout
+            self.fout = SpecWriter(sys.stdout, name=STDIN)
 
     def _unbrace_keywords(self) -> List[str]:
         """
         Create a list of keywords that shouldn't be in the curly brackets.
 
         It searches for keywords in the whitelist file, global macro functions in 'rpm --showrc' and macro functions
-        in the specfile.
+        in the specfile. Only the last ones are specific to the specfile, the rest is loaded once
+        per process.
 
         Returns:
             A list of such keywords.
         """
-        keywords = load_keywords_whitelist()
-        global_macrofuncs = parse_rpm_showrc()
-        spec_macrofuncs = find_macros_with_arg(self.options['specfile'])
-        return keywords + global_macrofuncs + spec_macrofuncs
+        with self.profiler.phase('load data'):
+            keywords = load_keywords_whitelist()
+        with self.profiler.phase('rpm --showrc'):
+            global_macrofuncs = parse_rpm_showrc()
+        return [*keywords, *global_macrofuncs, *self._spec_macrofuncs]
 
-    def _find_skip_parser(self) -> None:
+    def _scan_spec(self) -> int:
         """
-        Search the specfile for the user defined '#nospeccleaner' tag.
+        Read the facts about the whole specfile in one pass before it is cleaned.
 
-        This tag means that specfile shouldn't be cleaned. If the tag is found then
-        skip_run member is set to True, else it's False.
-        """
-        for line in self.fin:
-            if self.reg.re_skipcleaner.match(line):
-                self.skip_run = True
-                break
-        self.fin.seek(0)
+        It looks for:
+          * the user defined '#nospeccleaner' tag meaning that specfile shouldn't be cleaned
+            (skip_run member is set to True then),
+          * all present licenses which are loaded into 'options' member; if we have more than
+            one then put license to the each subpkg,
+          * the macro functions defined in the specfile,
+          * the name of the package (used for the header when the spec is read from stdin).
 
-    def _load_licenses(self) -> None:
-        """
-        Detect all present licenses in the specfile and load them into 'options' member.
+        Returns:
+            An int with the number of the lines of the specfile.
 
-        If we have more than one then put license to the each subpkg.
+        Raises:
+            RpmException if the specfile can't be read.
         """
         licenses: List[str] = []
-        for line in self.fin:
-            if self.reg.re_license.match(line):
+        self._spec_macrofuncs: List[str] = []
+        name = None
+        count = 0
+        try:
+            for count, line in enumerate(self.fin, 1):
                 line = line.rstrip('\n')
-                line = line.rstrip('\r')
-                line = line.rstrip()
-                match = self.reg.re_license.match(line)
-                value = match.groups()[-1]
-                if value not in licenses:
-                    licenses.append(value)
+                if Regexp.re_skipcleaner.match(line):
+                    self.skip_run = True
+                    continue
+                if Regexp.re_license.match(line):
+                    match = Regexp.re_license.match(line.rstrip('\r').rstrip())
+                    if match:
+                        value = match.groups()[-1]
+                        if value not in licenses:
+                            licenses.append(value)
+                    continue
+                match = Regexp.re_spec_macrofunc.match(line)
+                if match:
+                    self._spec_macrofuncs.append(match.group(1))
+                elif name is None:
+                    match = Regexp.re_name.match(line)
+                    if match:
+                        name = match.group(1)
+        except UnicodeDecodeError as error:
+            raise RpmException(str(error))
+        self.fin.seek(0)
         if len(licenses) > 1:
             self.options['subpkglicense'] = True
             # put first license as placeholder if main preamble is missing one
             self.options['license'] = licenses[0]
-        self.fin.seek(0)
+        if self.options['specfile'] == STDIN:
+            self.options['spec_name'] = name or 'package'
+        return count
 
     def _detect_preamble_section(self, line: str) -> bool:
         """
@@ -353,13 +415,14 @@ class RpmSpecCleaner(object):
                     self.options['specfile']
                 )
             )
-            for line in self.fin:
-                self.fout.write(line)
-            self.fout.flush()
+            shutil.copyfileobj(self.fin, self.fout)
+            self.fout.commit()
+            self.profiler.report()
             return
 
         # We always start with Copyright
         self.current_section = RpmCopyright(self.options)
+        self.profiler.instrument_section(self.current_section)
 
         # FIXME: we need to store the content locally and then reorder
         #        to maintain the specs all the same (eg somebody put
@@ -379,6 +442,7 @@ class RpmSpecCleaner(object):
                 )
                 # start new class
                 self.current_section = new_class(self.options)
+                self.profiler.instrument_section(self.current_section)
                 # skip empty line adding if we are switching sections
                 if self._previous_line == '' and line == '':
                     continue
@@ -387,7 +451,7 @@ class RpmSpecCleaner(object):
             if isinstance(self.current_section, RpmClean):
                 continue
 
-            self.current_section.add(line)
+            self.current_section.read(line)
             self._previous_line = line
             if line != '' and not line.startswith('#'):
                 self._previous_nonempty_line = line
@@ -400,10 +464,15 @@ class RpmSpecCleaner(object):
             and self._previous_nonempty_line != '%changelog'
         ):
             self.fout.write('%changelog\n')
-        self.fout.flush()
-
-        # if the '--diff' option was used, run the diff program
-        if self.options['diff']:
+        self.fout.commit()
+        if self.fout.unchanged:
+            sys.stderr.write('{0} unchanged\n'.format(self.fout.name))
+        self.profiler.report()
+
+        # if the '--diff' option was used, print the diff or run the diff program
+        if self.options['diff'] and self.options['diff_format'] == 'unified':
+            self._write_unified_diff()
+        elif self.options['diff']:
             cmd = shlex.split(
                 self.options['diff_prog']
                 + ' '
@@ -419,9 +488,31 @@ class RpmSpecCleaner(object):
                     % (self.options['diff_prog'].split()[0], error.strerror)
                 )
 
+    def _write_unified_diff(self) -> None:
+        """
+        Print the differences between the original and the cleaned spec as a unified diff.
+
+        The paths are relative to the current directory and have the 'a/' and 'b/' prefixes, so
+        the diffs of more specs can be concatenated into one patch applicable by 'git apply' (or
+        'patch -p1'). The spec outside of the current directory is named as given in both headers
+        (without the prefixes), so its diff can still be applied by 'patch <spec>'.
+        """
+        self.fin.seek(0)
+        fromfile = tofile = self.options['specfile']
+        path = os.path.relpath(fromfile)
+        if path != os.pardir and not path.startswith(os.pardir + os.sep):
+            fromfile = 'a/' + path.replace(os.sep, '/')
+            tofile = 'b/' + path.replace(os.sep, '/')
+        cleaned = self.fout.getvalue().splitlines(keepends=True)
+        for line in difflib.unified_diff(self.fin.readlines(), cleaned, fromfile, tofile):
+            sys.stdout.write(line)
+            if not line.endswith('\n'):
+                sys.stdout.write('\n\\ No newline at end of file\n')
+        sys.stdout.flush()
+
     def __del__(self) -> None:
-        """Close the input and output files."""
-        if self.fin:
+        """Close the input and output files (they are not there if the initialization failed)."""
+        if getattr(self, 'fin', None):
             self.fin.close()
-        if self.fout:
+        if getattr(self, 'fout', None):
             self.fout.close()
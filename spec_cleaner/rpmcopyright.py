@@ -1,8 +1,8 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
 import os
-from typing import IO
 
+from .fileutils import SpecWriter
 from .rpmsection import Section
 
 
@@ -23,9 +23,11 @@ class RpmCopyright(Section):
         self.buildrules = []
         self.distro_copyright = '# Copyright (c) {0} SUSE LLC'.format(self.year)
         self.vimmodeline = ''
+        # the spec read from stdin is named after the package
+        self.specname = options.get('spec_name') or os.path.splitext(os.path.basename(self.spec))[0]
 
     def _add_pkg_header(self):
-        specname = os.path.splitext(os.path.basename(self.spec))[0]
+        specname = self.specname
         self.lines.append(
             """#
 # spec file for package {0}
@@ -94,7 +96,7 @@ class RpmCopyright(Section):
             # anything not in our rules gets tossed out
             return
 
-    def output(self, fout: IO[str], newline: bool = True, new_class_name: str = None):
+    def output(self, fout: SpecWriter, newline: bool = True, new_class_name: str = None):
         if not self.no_copyright:
             self._add_modelines()
             self._add_pkg_header()
@@ -1,4 +1,5 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
+from typing import Optional
 
 from .rpmsection import Section
 
@@ -6,26 +7,50 @@ from .rpmsection import Section
 class RpmFiles(Section):
     """A class providing methods for %files section cleaning."""
 
-    def add(self, line: str) -> None:
-        line = self._complete_cleanup(line)
-        line = self.strip_useless_spaces(line)
-        line = self._remove_doc_on_man(line)
-        line = self._move_license_from_doc(line)
-        # we only get empty %doc left over
+    batched = True
+
+    @staticmethod
+    def _remove_empty_doc(line: str) -> Optional[str]:
+        """
+        Drop the line if we only got empty %doc left over.
+
+        Args:
+            line: A string representing a line to process.
+
+        Returns:
+            The line or None if it should be dropped.
+        """
         if line == '%doc ':
-            return
+            return None
+        return line
 
-        if not self.minimal:
-            # prune obsolete defattr that is default
-            if self.reg.re_defattr.match(line):
-                return
-            line = self._set_man_compression(line)
+    def _remove_defattr(self, line: str) -> Optional[str]:
+        """
+        Prune obsolete defattr that is default.
 
-        # toss out empty lines if there are more than one in succession
-        if line == '' and (not self.previous_line or self.previous_line == ''):
-            return
+        Args:
+            line: A string representing a line to process.
 
-        Section.add(self, line)
+        Returns:
+            The line or None if it should be dropped.
+        """
+        if self.reg.re_defattr.match(line):
+            return None
+        return line
+
+    def _remove_duplicate_empty_line(self, line: str) -> Optional[str]:
+        """
+        Toss out empty lines if there are more than one in succession.
+
+        Args:
+            line: A string representing a line to process.
+
+        Returns:
+            The line or None if it should be dropped.
+        """
+        if line == '' and (not self.previous_line or self.previous_line == ''):
+            return None
+        return line
 
     @staticmethod
     def _remove_doc_on_man(line: str) -> str:
@@ -77,5 +102,5 @@ class RpmFiles(Section):
                 licences += match.group()
                 line = self.reg.re_doclicense.sub('', line, 1)
                 match = self.reg.re_doclicense.search(line)
-            Section.add(self, '%license {}'.format(licences))
+            self._append('%license {}'.format(licences))
         return line
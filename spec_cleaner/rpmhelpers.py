@@ -1,10 +1,19 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from subprocess import check_output
-from typing import Dict, List
-
-from .fileutils import open_datafile, open_stringio_spec
+from typing import Dict, Iterable, List, Tuple
+
+from .fileutils import open_datafile
+from .license_parser import (
+    LicenseParseError,
+    join_license,
+    normalize_license,
+    parse_license,
+    tokenize_license,
+)
 from .rpmexception import RpmException
 from .rpmrequirestoken import RpmRequiresToken
 
@@ -16,13 +25,20 @@ CMAKE_CONVERSIONS = 'cmake_conversions.txt'
 GROUPS_LIST = 'allowed_groups.txt'
 BRACKETING_EXCLUDES = 'excludes-bracketing.txt'
 
+# fixed licenses: (value, id of conversions) -> (conversions, fixed value)
+LICENSE_CACHE_SIZE = 1024
+_license_cache: 'OrderedDict[Tuple[str, int], Tuple[Dict[str, str], str]]' = OrderedDict()
+
 
-def parse_rpm_showrc() -> List[str]:
+@lru_cache(maxsize=None)
+def parse_rpm_showrc() -> Tuple[str, ...]:
     """
     Create a list of all macro functions in the 'rpm --showrc' output.
 
+    The output does not change during the run so it is cached for all the processed specfiles.
+
     Returns:
-        A list of such macro functions.
+        A tuple of such macro functions.
     """
     macros: List[str] = []
 
@@ -32,39 +48,19 @@ def parse_rpm_showrc() -> List[str]:
         found_macro = re_rc_macrofunc.sub(r'\1', line)
         if found_macro != line:
             macros += [found_macro]
-    return macros
+    return tuple(macros)
 
 
-def load_keywords_whitelist() -> List[str]:
+@lru_cache(maxsize=None)
+def load_keywords_whitelist() -> Tuple[str, ...]:
     """
     Create a list of keywords contained in BRACKETING_EXCLUDES file (keywords that shouldn't be in brackets).
 
     Returns:
-        A list of such keywords.
+        A tuple of such keywords.
     """
     with open_datafile(BRACKETING_EXCLUDES) as f:
-        return [line.rstrip('\n') for line in f]
-
-
-def find_macros_with_arg(spec: str) -> List[str]:
-    """
-    Create a list of all macro functions in the spec file.
-
-    Args:
-        spec: A string with the path to the specfile.
-
-    Returns:
-        A list of such macro functions.
-    """
-    macrofuncs: List[str] = []
-
-    re_spec_macrofunc = re.compile(r'^\s*%define\s(\w+)\(.*')
-    with open_stringio_spec(spec) as f:
-        for line in (i.rstrip('\n') for i in f):
-            found_macro = re_spec_macrofunc.sub(r'\1', line)
-            if found_macro != line:
-                macrofuncs += [found_macro]
-    return macrofuncs
+        return tuple(line.rstrip('\n') for line in f)
 
 
 def read_conversion_changes(conversion_file):
@@ -102,6 +98,34 @@ def read_cmake_changes():
     return read_conversion_changes(CMAKE_CONVERSIONS)
 
 
+def merge_conversions(
+    conversions: Iterable[Tuple[str, Dict[str, str]]]
+) -> Dict[str, Tuple[str, ...]]:
+    """
+    Merge the dependency conversion tables to one index.
+
+    The first table containing the name wins, so the tables are given in the descending priority.
+    The 'pkgconfig' dependency and the rpm-macroed content are never converted.
+
+    Args:
+        conversions: (brackety, table) tuples where the table maps the package names to the
+                     space separated names used in the brackety dependencies.
+
+    Returns:
+        A dict mapping the package names to the tuples of their brackety dependencies
+        (e.g. 'glib2-devel' -> ('pkgconfig(glib-2.0)', 'pkgconfig(gobject-2.0)', ...)).
+    """
+    index: Dict[str, Tuple[str, ...]] = {}
+    for brackety, table in conversions:
+        for name, targets in table.items():
+            if name != 'pkgconfig' and not name.startswith('%') and name not in index:
+                index[name] = tuple(
+                    '{0}({1})'.format(brackety, target) for target in targets.split()
+                )
+    return index
+
+
+@lru_cache(maxsize=None)
 def read_licenses_changes() -> Dict[str, str]:
     """
     Create mapping of old licences to new licences.
@@ -112,8 +136,11 @@ def read_licenses_changes() -> Dict[str, str]:
 
     Tab is used as a separator.
 
+    The mapping is read only once, so it is the same object in all the runs (and the fixed
+    licenses cached for it can be reused).
+
     Returns:
-        A dict with the mapping.
+        A dict with the mapping (don't modify it).
 
     """
     with open_datafile(LICENSES_CHANGES) as f:
@@ -137,6 +164,9 @@ def fix_license(value, conversions):
     """
     Fix license string to match up current SPDX format.
 
+    The results are cached for the given conversions (the same license strings are fixed for all
+    the subpackages and over and over in the batch runs).
+
     Args:
         value: the current license string
         conversions: list of known license format replacements
@@ -144,36 +174,27 @@ def fix_license(value, conversions):
     Returns:
         string with the new license
     """
-    # license ; should be replaced by ands so find it
-    re_license_semicolon = re.compile(r'\s*;\s*')
-    value = value.rstrip(';')
-    value = re_license_semicolon.sub(' and ', value)
-    # split using 'or', 'and' and parenthesis, ignore empty strings
-    licenses = []
-    for a in re.split(r'(\(|\)| and | AND | OR | or (?!later)|;)', value):
-        if a != '':
-            licenses.append(a)
-    if not licenses:
-        licenses.append(value)
-
-    for (index, my_license) in enumerate(licenses):
-        my_license = ' '.join(my_license.split())
-        my_license = my_license.replace('ORlater', 'or later')
-        my_license = my_license.replace('ORsim', 'or similar')
-        if my_license in conversions:
-            my_license = conversions[my_license]
-        licenses[index] = my_license
-
-    # create back new string with replaced licenses
-    s = (
-        ' '.join(licenses)
-        .replace('( ', '(')
-        .replace(' )', ')')
-        .replace(' and ', ' AND ')
-        .replace(' or ', ' OR ')
-        .replace(' with ', ' WITH ')
-    )
-    return s
+    key = (value, id(conversions))
+    cached = _license_cache.get(key)
+    # the cache holds the conversions so their id can't be reused while cached
+    if cached is not None and cached[0] is conversions:
+        _license_cache.move_to_end(key)
+        return cached[1]
+    fixed = _fix_license(value, conversions)
+    _license_cache[key] = (conversions, fixed)
+    if len(_license_cache) > LICENSE_CACHE_SIZE:
+        _license_cache.popitem(last=False)
+    return fixed
+
+
+def _fix_license(value, conversions):
+    try:
+        return normalize_license(parse_license(value), conversions)
+    except LicenseParseError:
+        pass
+    # not a well formed expression, convert just the pieces we have
+    licenses = tokenize_license(value) or ['']
+    return join_license([conversions.get(my_license, my_license) for my_license in licenses])
 
 
 def sort_uniq(seq):
@@ -1,4 +1,5 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
+from typing import Optional
 
 from .rpmsection import Section
 
@@ -11,19 +12,33 @@ class RpmInstall(Section):
     Replace %makeinstall (suse-ism).
     """
 
-    def add(self, line: str) -> None:
-        line = self._complete_cleanup(line)
+    batched = True
 
-        # we do not want to cleanup buildroot, it is already clean
+    def _remove_clean_buildroot(self, line: str) -> Optional[str]:
+        """
+        Drop the removal of the buildroot, it is already clean.
+
+        Args:
+            line: A string representing a line to process.
+
+        Return:
+            The line or None if it should be dropped.
+        """
         if self.reg.re_clean.search(line):
-            return
+            return None
+        return line
 
-        line = self.reg.re_jobs.sub(' %{?_smp_mflags}', line)
-        if not self.minimal:
-            line = self._replace_remove_la(line)
-            line = self._replace_install_command(line)
+    def _replace_jobs(self, line: str) -> str:
+        """
+        Replace various jobs macros with %{?_smp_mflags}.
+
+        Args:
+            line: A string representing a line to process.
 
-        Section.add(self, line)
+        Return:
+            The processed line.
+        """
+        return self.reg.re_jobs.sub(' %{?_smp_mflags}', line)
 
     def _replace_install_command(self, line: str) -> str:
         """
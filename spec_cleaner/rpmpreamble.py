@@ -2,11 +2,13 @@
 
 import os.path
 import re
+from functools import partial
 from ssl import CertificateError, SSLError
 from urllib import error, parse
 from urllib.request import urlopen
 
-from .dependency_parser import DependencyParser
+from .dependency_parser import dependency_tokens, parse_dependencies
+from .profiler import MemoryProfiler, NullProfiler
 from .rpmhelpers import fix_license
 from .rpmpreambleelements import RpmPreambleElements
 from .rpmrequirestoken import RpmRequiresToken
@@ -37,9 +39,66 @@ class RpmPreamble(Section):
         line, even if we reorder the lines.
     """
 
+    # the tags needing special attention and the names of their handlers
+    tag_handlers = {
+        'url': '_add_url',
+        'source': '_add_source',
+        'patch': '_add_patch',
+        'provides': '_add_provides',
+        'obsoletes': '_add_obsoletes',
+        'prereq': '_add_prereq',
+        'requires': '_add_requires',
+        'license': '_add_license',
+        'release': '_add_release',
+        'summary': '_add_summary',
+        'group': '_add_group',
+        'buildarch': '_add_buildarch',
+        'buildarchitectures': '_add_buildarch',
+    }
+
+    # the tags of the simple categories (see category_to_re)
+    simple_tags = {
+        'name': 'name',
+        'version': 'version',
+        'nosource': 'nosource',
+        'buildrequires': 'buildrequires',
+        'buildprereq': 'buildrequires',
+        'buildconflicts': 'buildconflicts',
+        'conflicts': 'conflicts',
+        'recommends': 'recommends',
+        'suggests': 'suggests',
+        'enhances': 'enhances',
+        'supplements': 'supplements',
+        'removepathpostfixes': 'removepath',
+        'excludearch': 'excludearch',
+        'excludearchitectures': 'excludearch',
+        'exclusivearch': 'exclusivearch',
+        'exclusivearchitectures': 'exclusivearch',
+    }
+
+    # the tags of the deprecated definitions (see category_to_clean)
+    deprecated_tags = {
+        'vendor': 'vendor',
+        'autoreqprov': 'autoreqprov',
+        'epoch': 'epoch',
+        'icon': 'icon',
+        'copyright': 'copyright',
+        'packager': 'packager',
+        'prefix': 'prefix',
+        'buildroot': 'buildroot',
+    }
+
     def __init__(self, options):
         """Initialize all the global variables and known categories."""
         Section.__init__(self, options)
+        # Times the URL probing and the flattening with '--profile'
+        self.profiler = options.get('profiler') or NullProfiler()
+        # The dependency tokens and the element trees are measured with '--memprofile'
+        if isinstance(self.profiler, MemoryProfiler):
+            self._fix_list_of_packages = self.profiler.wrap(
+                self._fix_list_of_packages, 'RpmRequiresToken lists'
+            )
+            self._add_line_to = self.profiler.wrap(self._add_line_to, 'RpmPreambleElements trees')
         # Old storage
         self._oldstore = []
         # Is the parsed variable multiline (ending with \)
@@ -71,8 +130,14 @@ class RpmPreamble(Section):
         self.perl_conversions = options['perl_conversions']
         self.cmake_conversions = options['cmake_conversions']
         self.tex_conversions = options['tex_conversions']
+        # index of all the enabled conversions: name -> brackety dependencies
+        self.dependency_conversions = options['dependency_conversions']
         # list of allowed groups
         self.allowed_groups = options['allowed_groups']
+        # option dependent behaviour decided once for the run
+        self._drop_groups = self.remove_groups and not self.minimal
+        self._check_groups = bool(self.allowed_groups) and not self.minimal
+        self._fix_requires = not self.minimal
         # start the object
         self.paragraph = RpmPreambleElements(options)
         # license handling
@@ -125,26 +190,39 @@ class RpmPreamble(Section):
             'py_requires': self.reg.re_py_requires,
         }
 
+        # handlers of the lines by their tag (the word at the start of the line, case-folded)
+        self._tag_handlers = {
+            tag: getattr(self, handler) for tag, handler in self.tag_handlers.items()
+        }
+        for tag, category in self.simple_tags.items():
+            self._tag_handlers[tag] = partial(self._add_simple_tag, category)
+        for tag, category in self.deprecated_tags.items():
+            self._tag_handlers[tag] = partial(self._remove_tag, category)
+
     def start_subparagraph(self):
         """Backup the paragraph and start a new one."""
         self._oldstore.append(self.paragraph)
         self.paragraph = RpmPreambleElements(self.options)
 
+    def _conditions_size(self):
+        """Count the lines of the condition (the opening element and the lines of the branches)."""
+        return 1 + sum(block.size for block in self.paragraph.items['conditions'][1:])
+
     def _prune_ppc_condition(self):
         """Check if we have ppc64 obsolete and delete it."""
         if (
             not self.minimal
-            and len(self.paragraph.items['conditions']) == 3
+            and self._conditions_size() == 3
             and isinstance(self.paragraph.items['conditions'][0], list)
             and self.paragraph.items['conditions'][0][0] == '# bug437293'
-            and self.paragraph.items['conditions'][1].endswith('64bit')
+            and str(self.paragraph.items['conditions'][1].first_line()).endswith('64bit')
         ):
             self.paragraph.items['conditions'] = []
 
     def _prune_empty_condition(self):
         """Remove empty conditions."""
         # check if we start with if
-        if len(self.paragraph.items['conditions']) == 2 and (
+        if self._conditions_size() == 2 and (
             (
                 isinstance(self.paragraph.items['conditions'][0], list)
                 and self.paragraph.items['conditions'][0][-1].startswith('%if')
@@ -217,17 +295,17 @@ class RpmPreamble(Section):
         End the paragraph and flatten the output.
 
         If we are at the end we need to flatten and sort everything and give it
-        in the layers to the paragraph above us.
+        in the layers to the paragraph above us. The flattened branch is kept as one block
+        (with the nested blocks in it) which is moved to its final location and rendered
+        only in the output.
         """
-        if not self._oldstore:
-            nested = False
-        else:
-            nested = True
-        lines = self.paragraph.flatten_output(False, nested)
+        with self.profiler.phase('RpmPreambleElements.flatten_block') as stats:
+            block = self.paragraph.flatten_block()
+            stats.lines += block.size
         if len(self.paragraph.items['define']) > 0 or len(self.paragraph.items['bconds']) > 0:
             self._condition_define = True
         self.paragraph = self._oldstore.pop(-1)
-        self.paragraph.items['conditions'] += lines
+        self.paragraph.items['conditions'].append(block)
 
         # If we are on endif we check the condition content
         # and if we find the defines we put it on top.
@@ -261,68 +339,35 @@ class RpmPreamble(Section):
                 self._pattern_condition = False
             self.paragraph.items['conditions'] = []
 
-    @staticmethod
-    def _pkgname_to_brackety(token, brackety, conversions):
-        converted = []
-        # just never convert pkgconfig dependency
-        # The same if we do not have a match
-        if token.name == 'pkgconfig' or token.name not in conversions:
-            return token
-        else:
-            # first split the data
-            convers_list = conversions[token.name].split()
-            # then add each pkgconfig to the list
-            # print pkgconf_list
-            for j in convers_list:
-                name = '{0}({1})'.format(brackety, j)
-                converted.append(RpmRequiresToken(name, token.operator, token.version))
-        return converted
-
     def _fix_list_of_packages(self, value, category):
         # we do fix the package list only if there is no rpm call there on line
         # otherwise print there warning about nicer content and skip
         if self.reg.re_rpm_command.search(value):
             if (
-                category == 'requires'
+                self._fix_requires
+                and category == 'requires'
                 and not self.previous_line.startswith('#')
-                and not self.minimal
             ):
                 self.paragraph.current_group.append('# FIXME: Use %requires_eq macro instead')
             return [value]
-        tokens = DependencyParser(value).flat_out()
         # loop over all and do formatting as we can get more deps for one
+        # in scriptlets we most probably do not want the converted deps
+        if category == 'prereq' or category == 'requires_phase' or not self.dependency_conversions:
+            return dependency_tokens(value)
         expanded = []
-        for token in tokens:
-            # skip all various rpm-macroed content as it
-            # is usually not easy to determine how that should be
-            # split
-            if token.name.startswith('%'):
-                expanded.append(token)
-                continue
-            # in scriptlets we most probably do not want the converted deps
-            if category != 'prereq' and category != 'requires_phase':
-                # here we go with descending priority to find match and replace
-                # the strings by some optimistic value of brackety dep
-                # priority is based on the first come first serve
-                if self.pkgconfig:
-                    token = self._pkgname_to_brackety(
-                        token, 'pkgconfig', self.pkgconfig_conversions
-                    )
-                # checking if it is not list is simple avoidance of running
-                # over already converted values
-                if not isinstance(token, list) and self.perl:
-                    token = self._pkgname_to_brackety(token, 'perl', self.perl_conversions)
-                if not isinstance(token, list) and self.tex:
-                    token = self._pkgname_to_brackety(token, 'tex', self.tex_conversions)
-                if not isinstance(token, list) and self.cmake:
-                    token = self._pkgname_to_brackety(token, 'cmake', self.cmake_conversions)
-            if isinstance(token, list):
-                expanded += token
+        for name, operator, version in parse_dependencies(value):
+            # replace the strings by some optimistic value of brackety dep; the name is looked
+            # up as written in the spec, before RpmRequiresToken normalizes it (so e.g.
+            # otherproviders() is never converted and the rpm-macroed content is never in the index)
+            converted = self.dependency_conversions.get(name)
+            if converted is None:
+                expanded.append(RpmRequiresToken(name, operator, version))
             else:
-                expanded.append(token)
+                for new_name in converted:
+                    expanded.append(RpmRequiresToken(new_name, operator, version))
         return expanded
 
-    def _add_line_value_to(self, category, value, key=None):
+    def _add_line_value_to(self, category, value, key=None, sort_key=None):
         """
         Change a key-value line, to make sure we have the right spacing.
 
@@ -337,25 +382,28 @@ class RpmPreamble(Section):
                 if isinstance(value, str):
                     value = key + value
                 else:
-                    value.prefix = key
+                    value = value.with_prefix(key)
                 self._add_line_to(category, value)
         else:
             line = key + value
-            self._add_line_to(category, line)
+            self._add_line_to(category, line, sort_key)
 
-    def _add_line_to(self, category, line):
+    def _add_line_to(self, category, line, sort_key=None):
+        rendered = str(line)
         if self.paragraph.current_group:
             if isinstance(line, RpmRequiresToken):
                 line.comments = self.paragraph.current_group
-                self.paragraph.items[category].append(line)
+                self.paragraph.add_item(category, line, rendered, sort_key)
             else:
                 self.paragraph.current_group.append(line)
-                self.paragraph.items[category].append(self.paragraph.current_group)
+                self.paragraph.add_item(
+                    category, self.paragraph.current_group, rendered, sort_key
+                )
             self.paragraph.current_group = []
         else:
-            self.paragraph.items[category].append(line)
+            self.paragraph.add_item(category, line, rendered, sort_key)
 
-        self.previous_line = str(line)
+        self.previous_line = rendered
 
     def add(self, line):
         """Run over options and add the determined line to proper location."""
@@ -384,12 +432,24 @@ class RpmPreamble(Section):
                     self.multiline = False
             return
 
+        # the lines starting with a tag go right to the handler of the tag,
+        # all the others are conditions, comments or macros
+        match = self.reg.re_preamble_tag.match(line)
+        if not match:
+            self._add_special_line(line)
+            return
+        handler = self._tag_handlers.get(match.group(1).lower())
+        if not handler or not handler(line):
+            self._add_line_to('misc', line)
+
+    def _add_special_line(self, line):
+        """Add the line which does not start with a tag."""
         # If we match the if else or endif we create subgroup
         # this is basically our class again until we match
         # else where we mark end of paragraph or endif
         # which mark the end of our subclass and that we can
         # return the data to our main class for at-bottom placement
-        elif self.reg.re_if.match(line) or self.reg.re_codeblock.match(line):
+        if self.reg.re_if.match(line) or self.reg.re_codeblock.match(line):
             self._add_line_to('conditions', line)
             self.condition = True
             # check for possibility of the bcond conditional
@@ -397,7 +457,6 @@ class RpmPreamble(Section):
                 self._condition_bcond = True
             self.start_subparagraph()
             self.previous_line = line
-            return
 
         elif self.reg.re_else_elif.match(line):
             if self.condition:
@@ -405,7 +464,6 @@ class RpmPreamble(Section):
                 self.end_subparagraph()
                 self.start_subparagraph()
             self.previous_line = line
-            return
 
         elif self.reg.re_endif.match(line) or self.reg.re_endcodeblock.match(line):
             self._add_line_to('conditions', line)
@@ -415,88 +473,20 @@ class RpmPreamble(Section):
                 self.condition = False
             self.end_subparagraph(True)
             self.previous_line = line
-            return
 
         elif self.reg.re_comment.match(line) and not self.reg.re_buildignores.match(line):
             if line or self.previous_line:
                 self.paragraph.current_group.append(line)
                 self.previous_line = line
-            return
-
-        # replace 'http' with 'https' in URL if https is reachable (#246)
-        elif self.reg.re_url.match(line):
-            match = self.reg.re_url.match(line)
-            orig_url = match.group(1)
-            value = orig_url
-
-            if orig_url.startswith('http://'):
-                https_url = orig_url.replace('http', 'https', 1)
-            elif parse.urlparse(orig_url).scheme == '':
-                https_url = 'https://' + orig_url
-            else:
-                https_url = None
-
-            response = None
-            try:
-                if https_url and not self.minimal:
-                    response = urlopen(https_url, timeout=1)
-                    if response.getcode() == 200:
-                        value = https_url
-            # ssl.CertificateError is a subclass of SSLError in Python 3.7. In Python 3.6 it's not.
-            except (error.URLError, SSLError, CertificateError):
-                pass
-            finally:
-                self._add_line_value_to('url', value, key='URL')
-                if response:
-                    response.close()
-            return
-
-        elif self.reg.re_source.match(line):
-            match = self.reg.re_source.match(line)
-            source = match.group(2)
-            if not self.minimal:
-                source = self._fix_pypi_source(source)
-            self._add_line_value_to('source', source, key='Source%s' % match.group(1))
-            return
-
-        elif self.reg.re_patch.match(line):
-            match = self.reg.re_patch.match(line)
-            # convert Patch: to Patch0:
-            if match.group(2) == '':
-                zero = '0'
-            else:
-                zero = ''
-            self._add_line_value_to(
-                'patch', match.group(3), key='%sPatch%s%s' % (match.group(1), zero, match.group(2)),
-            )
-            return
 
         elif self.reg.re_bcond_with.match(line):
             self._add_line_to('bconds', line)
-            return
 
         elif self.reg.re_mingw.match(line):
             self._add_line_to('define', line)
-            return
 
         elif self.reg.re_patterndefine.match(line):
             self._add_line_to('define', line)
-            return
-
-        elif self.reg.re_provides.match(line) and self.reg.re_patternmacro.search(line):
-            match = self.reg.re_provides.match(line)
-            self._add_line_value_to('patternprovides', match.group(1), key='Provides')
-            return
-
-        elif self.reg.re_provides.match(line) and self.reg.re_patternobsolete.search(line):
-            match = self.reg.re_provides.match(line)
-            self._add_line_value_to('patternobsoletes', match.group(1), key='Provides')
-            return
-
-        elif self.reg.re_obsoletes.match(line) and self.reg.re_patternobsolete.search(line):
-            match = self.reg.re_obsoletes.match(line)
-            self._add_line_value_to('patternobsoletes', match.group(1), key='Obsoletes')
-            return
 
         elif self.reg.re_requires_eq.match(line):
             match = self.reg.re_requires_eq.match(line)
@@ -507,7 +497,6 @@ class RpmPreamble(Section):
             else:
                 value = match.group(2)
             self._add_line_value_to('requires_eq', value)
-            return
 
         elif self.reg.re_requires_ge.match(line):
             match = self.reg.re_requires_ge.match(line)
@@ -518,7 +507,6 @@ class RpmPreamble(Section):
             else:
                 value = match.group(2)
             self._add_line_value_to('requires_ge', value)
-            return
 
         elif (
             self.reg.re_define.match(line)
@@ -544,126 +532,220 @@ class RpmPreamble(Section):
                 define, name, value = line.split(None, 2)
                 self.modname = value
 
-            return
+        # deprecated macros that we no longer want to see
+        elif self.reg.re_debugpkg.match(line) or self.reg.re_py_requires.match(line):
+            pass
 
-        elif self.reg.re_prereq.match(line):
-            match = self.reg.re_prereq.match(line)
-            self._add_line_value_to('prereq', match.group(1))
-            return
+        elif not self._add_simple_tag('buildignores', line) and not self._add_simple_tag(
+            'tail', line
+        ):
+            self._add_line_to('misc', line)
+
+    # The handlers of the lines starting with a tag. They return False if the line does not match
+    # (and it goes to misc then).
+
+    def _add_simple_tag(self, category, line):
+        """Add the value of the tag which does not require special attention."""
+        match = self.category_to_re[category].match(line)
+        if not match:
+            return False
+        # instead of matching first group as there is only one,
+        # take the last group (including "whole match" if no groups present)
+        # (so I can have more advanced regexp for RPM tags)
+        self._add_line_value_to(category, match.group(len(match.groups())))
+        return True
+
+    def _remove_tag(self, category, line):
+        """Drop the deprecated definition."""
+        return bool(self.category_to_clean[category].match(line))
+
+    def _add_url(self, line):
+        # replace 'http' with 'https' in URL if https is reachable (#246)
+        match = self.reg.re_url.match(line)
+        if not match:
+            return False
+        orig_url = match.group(1)
+        value = orig_url
+
+        if orig_url.startswith('http://'):
+            https_url = orig_url.replace('http', 'https', 1)
+        elif parse.urlparse(orig_url).scheme == '':
+            https_url = 'https://' + orig_url
+        else:
+            https_url = None
+
+        response = None
+        try:
+            if https_url and not self.minimal:
+                with self.profiler.phase('URL probing'):
+                    response = urlopen(https_url, timeout=1)
+                if response.getcode() == 200:
+                    value = https_url
+        # ssl.CertificateError is a subclass of SSLError in Python 3.7. In Python 3.6 it's not.
+        except (error.URLError, SSLError, CertificateError):
+            pass
+        finally:
+            self._add_line_value_to('url', value, key='URL')
+            if response:
+                response.close()
+        return True
+
+    def _add_source(self, line):
+        match = self.reg.re_source.match(line)
+        if not match:
+            return False
+        source = match.group(2)
+        if not self.minimal:
+            source = self._fix_pypi_source(source)
+        # sources without number are sorted as the first one
+        self._add_line_value_to(
+            'source', source, key='Source%s' % match.group(1), sort_key=int(match.group(1) or '1'),
+        )
+        return True
+
+    def _add_patch(self, line):
+        match = self.reg.re_patch.match(line)
+        if not match:
+            return False
+        # convert Patch: to Patch0:
+        if match.group(2) == '':
+            zero = '0'
+        else:
+            zero = ''
+        self._add_line_value_to(
+            'patch',
+            match.group(3),
+            key='%sPatch%s%s' % (match.group(1), zero, match.group(2)),
+            sort_key=int(zero + match.group(2)),
+        )
+        return True
+
+    def _add_provides(self, line):
+        match = self.reg.re_provides.match(line)
+        if not match:
+            return False
+        if self.reg.re_patternmacro.search(line):
+            self._add_line_value_to('patternprovides', match.group(1), key='Provides')
+        elif self.reg.re_patternobsolete.search(line):
+            self._add_line_value_to('patternobsoletes', match.group(1), key='Provides')
+        else:
+            self._add_line_value_to('provides_obsoletes', match.group(1), key='Provides')
+        return True
 
+    def _add_obsoletes(self, line):
+        match = self.reg.re_obsoletes.match(line)
+        if not match:
+            return False
+        if self.reg.re_patternobsolete.search(line):
+            self._add_line_value_to('patternobsoletes', match.group(1), key='Obsoletes')
+        else:
+            self._add_line_value_to('provides_obsoletes', match.group(1), key='Obsoletes')
+        return True
+
+    def _add_prereq(self, line):
+        match = self.reg.re_prereq.match(line)
+        if not match:
+            return False
+        self._add_line_value_to('prereq', match.group(1))
+        return True
+
+    def _add_requires(self, line):
         # replace pwdutils with shadow in Requires (#247)
-        elif self.reg.re_requires.match(line):
-            match = self.reg.re_requires.match(line)
-            if match.group(1) == 'pwdutils' and not self.condition and not self.minimal:
+        match = self.reg.re_requires.match(line)
+        if match:
+            if match.group(1) == 'pwdutils' and self._fix_requires and not self.condition:
                 value = 'shadow'
             else:
                 value = match.group(1)
             self._add_line_value_to('requires', value, key='Requires')
-            return
+            return True
 
         # replace pwdutils with shadow in Requires(phase) (#247)
-        elif self.reg.re_requires_phase.match(line):
-            match = self.reg.re_requires_phase.match(line)
+        match = self.reg.re_requires_phase.match(line)
+        if match:
             # Put the requires content properly as key for formatting
-            if match.group(2) == 'pwdutils' and not self.condition and not self.minimal:
+            if match.group(2) == 'pwdutils' and self._fix_requires and not self.condition:
                 value = 'shadow'
             else:
                 value = match.group(2)
             self._add_line_value_to(
                 'requires_phase', value, key='Requires{0}'.format(match.group(1))
             )
-            return
-
-        elif self.reg.re_provides.match(line):
-            match = self.reg.re_provides.match(line)
-            self._add_line_value_to('provides_obsoletes', match.group(1), key='Provides')
-            return
-
-        elif self.reg.re_obsoletes.match(line):
-            match = self.reg.re_obsoletes.match(line)
-            self._add_line_value_to('provides_obsoletes', match.group(1), key='Obsoletes')
-            return
-
-        elif self.reg.re_license.match(line):
-            # first convert the license string to proper format and then append
-            match = self.reg.re_license.match(line)
-            value = match.groups()[len(match.groups()) - 1]
-            value = fix_license(value, self.license_conversions)
-            # only store subpkgs if they have different licenses
-            if not (type(self).__name__ == 'RpmPackage' and not self.subpkglicense):
-                self._add_line_value_to('license', value)
-            return
-
-        elif self.reg.re_release.match(line):
-            match = self.reg.re_release.match(line)
-            value = match.group(1)
-            if re.search(r'[a-zA-Z\s]', value):
-                self._add_line_value_to('release', value)
-            else:
-                self._add_line_value_to('release', '0')
-            return
+            return True
+        return False
+
+    def _add_license(self, line):
+        # first convert the license string to proper format and then append
+        match = self.reg.re_license.match(line)
+        if not match:
+            return False
+        value = match.groups()[len(match.groups()) - 1]
+        value = fix_license(value, self.license_conversions)
+        # only store subpkgs if they have different licenses
+        if not (type(self).__name__ == 'RpmPackage' and not self.subpkglicense):
+            self._add_line_value_to('license', value)
+        return True
+
+    def _add_release(self, line):
+        match = self.reg.re_release.match(line)
+        if not match:
+            return False
+        value = match.group(1)
+        if re.search(r'[a-zA-Z\s]', value):
+            self._add_line_value_to('release', value)
+        else:
+            self._add_line_value_to('release', '0')
+        return True
 
-        elif self.reg.re_summary_localized.match(line):
-            match = self.reg.re_summary_localized.match(line)
+    def _add_summary(self, line):
+        match = self.reg.re_summary_localized.match(line)
+        if match:
             # we need to know what language we need
             language = match.group(1)
             # and what value is there
             content = match.group(2)
             self._add_line_value_to('summary_localized', content, key='Summary{0}'.format(language))
-            return
-
-        elif self.reg.re_group.match(line):
-            # remove groups if requested
-            if not self.minimal and self.remove_groups:
-                return
-
-            # validate (if we have a list of groups)
-            match = self.reg.re_group.match(line)
-            value = match.group(1)
-            if not self.minimal and self.allowed_groups:
-                if (
-                    self.previous_line
-                    and not self.previous_line.startswith('# FIXME')
-                    and value not in self.allowed_groups
-                ):
-                    self.paragraph.current_group.append(
-                        '# FIXME: use correct group or remove it,'
-                        ' see "https://en.opensuse.org/openSUSE:Package_group_guidelines"'
-                    )
-            self._add_line_value_to('group', value)
-            return
-
-        elif self.reg.re_buildarch.match(line):
-            match = self.reg.re_buildarch.match(line)
-            value = match.group(2)
-            if value.startswith('noarch'):
-                self._add_line_value_to('buildarch', value)
-            else:
-                self._add_line_value_to('exclusivearch', value)
-
-        # loop for all other matching categories which
-        # do not require special attention
+            return True
+        return self._add_simple_tag('summary', line)
+
+    def _add_group(self, line):
+        match = self.reg.re_group.match(line)
+        if not match:
+            return False
+        # remove groups if requested
+        if self._drop_groups:
+            return True
+
+        # validate (if we have a list of groups)
+        value = match.group(1)
+        if self._check_groups:
+            if (
+                self.previous_line
+                and not self.previous_line.startswith('# FIXME')
+                and value not in self.allowed_groups
+            ):
+                self.paragraph.current_group.append(
+                    '# FIXME: use correct group or remove it,'
+                    ' see "https://en.opensuse.org/openSUSE:Package_group_guidelines"'
+                )
+        self._add_line_value_to('group', value)
+        return True
+
+    def _add_buildarch(self, line):
+        match = self.reg.re_buildarch.match(line)
+        if not match:
+            return False
+        value = match.group(2)
+        if value.startswith('noarch'):
+            self._add_line_value_to('buildarch', value)
         else:
-            # cleanup
-            for (_category, regexp) in self.category_to_clean.items():
-                match = regexp.match(line)
-                if match:
-                    return
-
-            # simple matching
-            for (category, regexp) in self.category_to_re.items():
-                match = regexp.match(line)
-                if match:
-                    # instead of matching first group as there is only one,
-                    # take the last group (including "whole match" if no groups present)
-                    # (so I can have more advanced regexp for RPM tags)
-                    self._add_line_value_to(category, match.group(len(match.groups())))
-                    return
-
-            self._add_line_to('misc', line)
+            self._add_line_value_to('exclusivearch', value)
+        return True
 
     def output(self, fout, newline=True, new_class=None):
         """Dump the results to the output list."""
-        lines = self.paragraph.flatten_output(self.subpkglicense)
+        with self.profiler.phase('RpmPreambleElements.flatten_output') as stats:
+            lines = self.paragraph.flatten_output(self.subpkglicense)
+            stats.lines += len(lines)
         self.lines += lines
         Section.output(self, fout, newline, new_class)
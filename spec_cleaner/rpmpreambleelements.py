@@ -1,5 +1,8 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
+from collections import defaultdict
+from operator import itemgetter
+
 from .rpmexception import RpmException
 from .rpmhelpers import (
     add_group,
@@ -11,6 +14,44 @@ from .rpmhelpers import (
 from .rpmrequirestoken import RpmRequiresToken
 
 
+class ConditionalBlock(object):
+    """
+    Flattened lines of one branch of the conditional block in the preamble.
+
+    The nested blocks are kept as the elements of the lines, so they are moved as a whole to their
+    final location and their lines are rendered only once in the final output.
+
+    Attributes:
+        lines: A list of the lines (strings, RpmRequiresTokens or nested ConditionalBlocks).
+        size: An int with the number of the lines including the ones of the nested blocks.
+    """
+
+    __slots__ = ('lines', 'size')
+
+    def __init__(self, lines):
+        """Wrap the lines of the branch and count them."""
+        self.lines = lines
+        self.size = sum(line.size if isinstance(line, ConditionalBlock) else 1 for line in lines)
+
+    def first_line(self):
+        """Get the first line of the block (or None if it is empty)."""
+        for line in self.lines:
+            if not isinstance(line, ConditionalBlock):
+                return line
+            first = line.first_line()
+            if first is not None:
+                return first
+        return None
+
+    def render(self, output):
+        """Append the rendered lines to the output list."""
+        for line in self.lines:
+            if isinstance(line, ConditionalBlock):
+                line.render(output)
+            else:
+                output.append(str(line))
+
+
 class RpmPreambleElements(object):
     """
     Class containing structure used in rpmpreamble.
@@ -92,6 +133,9 @@ class RpmPreambleElements(object):
         'tail',
     )
 
+    # position of the category in the output
+    category_position = {category: index for index, category in enumerate(categories_order)}
+
     # categories that are sorted based on value in them
     categories_with_sorted_package_tokens = [
         'patternprovides',
@@ -113,11 +157,23 @@ class RpmPreambleElements(object):
     # categories that are sorted based on key value (eg Patch0 before Patch1)
     categories_with_sorted_keyword_tokens = ('source', 'patch')
 
+    # all sorted categories
+    sorted_categories = frozenset(
+        categories_with_sorted_package_tokens + list(categories_with_sorted_keyword_tokens)
+    )
+
+    # categories that pass over conversion fixer, these packages actually need fixing
+    # after we sent the values to reorder them
+    categories_with_package_tokens = frozenset(
+        categories_with_sorted_package_tokens + ['provides_obsoletes']
+    )
+
     def __init__(self, options):
         """Initialize the default variables as some are dynamic."""
-        self.items = {}
-        for i in self.categories_order:
-            self.items[i] = []
+        # category -> list of the elements, the lists are created when the category is used
+        # (there is a new object for every conditional block and most of them have few categories);
+        # the sorted categories hold (sort key, element) pairs with the key computed on insertion
+        self.items = defaultdict(list)
         self.current_group = []
         # minimal mode
         self.minimal = options['minimal']
@@ -129,11 +185,6 @@ class RpmPreambleElements(object):
         self.license = options['license']
         # dict of license replacement options
         self.license_conversions = options['license_conversions']
-        # initialize list of groups that need to pass over conversion fixer
-        self.categories_with_package_tokens = self.categories_with_sorted_package_tokens[:]
-        # these packages actually need fixing after we sent the values to
-        # reorder them
-        self.categories_with_package_tokens.append('provides_obsoletes')
 
     def _sort_helper_key(self, a):
         if isinstance(a, str) or isinstance(a, RpmRequiresToken):
@@ -143,7 +194,10 @@ class RpmPreambleElements(object):
             key = str(a[-1])
         else:
             raise RpmException('Unknown type during sort: %s' % a)
+        return self._sort_key_from_line(key)
 
+    def _sort_key_from_line(self, key):
+        """Compute the sort key from the string of the (last) line of the element."""
         # Special case is the category grouping where we have to get the number in
         # after the value
         if self.reg.re_patch.match(key):
@@ -164,11 +218,34 @@ class RpmPreambleElements(object):
             key = '1' + key
         return key
 
+    def add_item(self, category, element, line=None, sort_key=None):
+        """
+        Add the element to the category.
+
+        For the sorted categories the sort key is computed here once and stored with the element,
+        so sorting does not need to render and match the elements again.
+
+        Args:
+            category: A string with the name of the category.
+            element: The element (string, RpmRequiresToken or a group list) to add.
+            line: A string of the (last) line of the element if it is already rendered.
+            sort_key: The sort key if it is known by the caller (e.g. the patch number).
+        """
+        if category in self.sorted_categories:
+            if sort_key is None:
+                if line is None:
+                    sort_key = self._sort_helper_key(element)
+                else:
+                    sort_key = self._sort_key_from_line(line)
+            self.items[category].append((sort_key, element))
+        else:
+            self.items[category].append(element)
+
     def _insert_value(self, category, value, key=None):
         """Add value to specified keystore."""
         key = self.compile_category_prefix(category, key)
         line = RpmRequiresToken(value, None, None, key)
-        self.items[category].append(line)
+        self.add_item(category, line)
 
     def _add_pkgconfig_buildrequires(self, nested):
         """
@@ -182,7 +259,7 @@ class RpmPreambleElements(object):
         """
         # first generate flat list from the BR
         buildrequires = []
-        for group in self.items['buildrequires']:
+        for _, group in self.items['buildrequires']:
             buildrequires += add_group(group)
         # Check if we need the pkgconfig
         if not self.br_pkgconfig_required and find_pkgconfig_statement(buildrequires):
@@ -228,54 +305,56 @@ class RpmPreambleElements(object):
         return elements
 
     @staticmethod
-    def _remove_duplicates(elements):
-        """Remove duplicate requires/buildrequires/etc."""
+    def _remove_duplicates(entries):
+        """
+        Remove duplicate requires/buildrequires/etc.
+
+        The entries are (sort key, element) pairs, so the key stays with the element which is
+        kept. Stored tokens are indexed by their prefix and name so each element is compared
+        only with the tokens it can match.
+        """
         results = []
-        for element in elements:
+        # (prefix, name) -> positions of the stored tokens in results
+        stored = {}
+        for entry in entries:
+            element = entry[1]
             match = False
             # anything else than requirestoken
             if not isinstance(element, RpmRequiresToken):
-                results.append(element)
-                continue
-            # no results stored yet
-            if not results:
-                results.append(element)
+                results.append(entry)
                 continue
+            # names and prefix must always match
+            positions = stored.setdefault((element.prefix, element.name), [])
             # search already stored content
-            for index, item in enumerate(results):
-                # if item is string we didn't match
-                if not isinstance(item, RpmRequiresToken):
-                    continue
-                # names and prefix must always match
-                if item.name == element.name and item.prefix == element.prefix:
-                    # do we have full match on everything
-                    if item.version == element.version and item.operator == element.operator:
-                        # append comment if needed only as we are 100% match
-                        if element.comments:
-                            tmp = results[index]
-                            if tmp.comments:
-                                tmp.comments += element.comments
-                            else:
-                                tmp.comments = element.comments
-                            results[index] = tmp
-                        match = True
-                        break
-                    # new one specifies version
-                    if not item.version and element.version:
+            for index in positions:
+                item = results[index][1]
+                # do we have full match on everything
+                if item.version == element.version and item.operator == element.operator:
+                    # append comment if needed only as we are 100% match
+                    if element.comments:
                         if item.comments:
-                            if element.comments:
-                                element.comments += item.comments
-                            else:
-                                element.comments = item.comments
-                        results[index] = element
-                        match = True
-                        break
-                    # for version determination which could be ommited one
-                    # must use rpm versionCompare to get same results
-                    # unfortunately it uses too many resources so we simply
-                    # leave this to the maintainer
+                            item.comments += element.comments
+                        else:
+                            item.comments = element.comments
+                    match = True
+                    break
+                # new one specifies version
+                if not item.version and element.version:
+                    if item.comments:
+                        if element.comments:
+                            element.comments += item.comments
+                        else:
+                            element.comments = item.comments
+                    results[index] = entry
+                    match = True
+                    break
+                # for version determination which could be ommited one
+                # must use rpm versionCompare to get same results
+                # unfortunately it uses too many resources so we simply
+                # leave this to the maintainer
             if not match:
-                results.append(element)
+                positions.append(len(results))
+                results.append(entry)
         return results
 
     def _run_global_list_operations(self, phase, elements):
@@ -322,8 +401,20 @@ class RpmPreambleElements(object):
 
     def flatten_output(self, needs_license=False, nested=False):
         """Do the finalized output for the itemlist."""
-        lines = []
         elements = []
+        for line in self._flatten(needs_license, nested):
+            if isinstance(line, ConditionalBlock):
+                line.render(elements)
+            else:
+                elements.append(str(line))
+        return elements
+
+    def flatten_block(self):
+        """Do the output of the conditional branch, keeping the nested blocks as they are."""
+        return ConditionalBlock(self._flatten(False, True))
+
+    def _flatten(self, needs_license, nested):
+        lines = []
 
         # add license to the package if missing and needed
         if needs_license and not self.items['license']:
@@ -331,20 +422,35 @@ class RpmPreambleElements(object):
             self._insert_value('license', self.license)
         # add pkgconfig dep
         self._add_pkgconfig_buildrequires(nested)
-        # remove duplicates
-        for i in self.categories_with_package_tokens:
-            self.items[i] = self._remove_duplicates(self.items[i])
-        for i in self.categories_order:
+        # only the categories with some content, in the order of output
+        categories = sorted(
+            (i for i in self.items if self.items[i]), key=self.category_position.__getitem__
+        )
+        for i in categories:
+            if i in self.sorted_categories:
+                entries = self.items[i]
+                # remove duplicates
+                if i in self.categories_with_package_tokens:
+                    entries = self._remove_duplicates(entries)
+                entries.sort(key=itemgetter(0))
+                self.items[i] = entries
+                elements = [element for _, element in entries]
+                # sort-out within the ordered groups based on the key
+                if i in self.categories_with_sorted_keyword_tokens:
+                    elements = sort_uniq(elements)
+            elif i in self.categories_with_package_tokens:
+                # remove duplicates
+                entries = self._remove_duplicates([(None, element) for element in self.items[i]])
+                elements = self.items[i] = [element for _, element in entries]
+            else:
+                elements = self.items[i]
             sorted_list = []
-            if i in self.categories_with_sorted_package_tokens:
-                self.items[i].sort(key=self._sort_helper_key)
-            # sort-out within the ordered groups based on the key
-            if i in self.categories_with_sorted_keyword_tokens:
-                self.items[i].sort(key=self._sort_helper_key)
-                self.items[i] = sort_uniq(self.items[i])
             # flatten the list from list of lists as no reordering is planned
-            for group in self.items[i]:
-                sorted_list += add_group(group)
+            for group in elements:
+                if isinstance(group, ConditionalBlock):
+                    sorted_list.append(group)
+                else:
+                    sorted_list += add_group(group)
             # now do all sorts of operations where we needed sorted lists
             lines += self._run_global_list_operations(i, sorted_list)
         if self.current_group:
@@ -352,7 +458,4 @@ class RpmPreambleElements(object):
             # random stuff that should be at the end anyway.
             lines += add_group(self.current_group)
             self.current_group = []
-
-        for line in lines:
-            elements.append(str(line))
-        return elements
+        return lines
@@ -10,14 +10,7 @@ class RpmPrep(Section):
     It simplifies %setup and %patch lines.
     """
 
-    def add(self, line):
-        """Executes the format operations for the Prep phase."""
-        line = self._complete_cleanup(line)
-        line = self._cleanup_setup(line)
-        if not self.minimal:
-            line = self._prepare_patch(line)
-            line = self._remove_dephell_call(line)
-        Section.add(self, line)
+    batched = True
 
     def _cleanup_setup(self, line: str) -> str:
         """
@@ -1,15 +1,14 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
 """Cleanup classes that drop most of the content."""
-from typing import IO
-
+from .fileutils import SpecWriter
 from .rpmsection import Section
 
 
 class RpmClean(Section):
     """Remove clean section."""
 
-    def output(self, fout: IO[str], newline: bool = True, new_class_name: str = None) -> None:
+    def output(self, fout: SpecWriter, newline: bool = True, new_class_name: str = None) -> None:
         """Do not output anything here."""
         pass
 
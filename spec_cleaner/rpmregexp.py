@@ -1,7 +1,8 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
 
 import re
-from typing import List
+from functools import lru_cache
+from typing import List, Match, Pattern, Tuple
 
 
 class Regexp(object):
@@ -45,6 +46,8 @@ class Regexp(object):
         r'^\s*(### COMMON-([a-zA-Z0-9]+)-END ###|# MANUAL END|# /MANUAL|# (END|/)SECTION)(\s.*|)$',
         re.IGNORECASE,
     )
+    # the word the tag lines start with (the tag without the number or the qualifier)
+    re_preamble_tag = re.compile(r'\s*([A-Za-z]+)')
     re_name = re.compile(r'^Name:\s*(\S*)', re.IGNORECASE)
     re_version = re.compile(r'^Version:\s*(.*)', re.IGNORECASE)
     re_release = re.compile(r'^Release:\s*(\S*)', re.IGNORECASE)
@@ -114,7 +117,7 @@ class Regexp(object):
     re_jobs = re.compile(r'%{?(_smp_mflags|\?_smp_flags|\?jobs:\s*-j\s*%(jobs|{jobs}))}?')
     re_make = re.compile(r'(^\s*)make(\s.*|)$')
     re_make_build = re.compile(r'(^\s*)%make_build(\s.*|)$')
-    re_optflags_quotes = re.compile(r'=\s*\${?RPM_OPT_FLAGS}?\s*$')
+    re_optflags_quotes = re.compile(r'=[^\S\n]*\${?RPM_OPT_FLAGS}?[^\S\n]*$', re.MULTILINE)
     re_optflags = re.compile(r'\${?RPM_OPT_FLAGS}?')
     re_suseupdateconfig = re.compile(r'%{?\??suse_update_config')
     re_configure = re.compile(r'(^|(.*\s)?)./configure(\s.*|)$')
@@ -150,6 +153,7 @@ class Regexp(object):
     re_icecream = re.compile(r'^#\s*icecream\s*$', re.IGNORECASE)
     re_vimmodeline = re.compile(r'^#\s*vim:', re.IGNORECASE)
     re_skipcleaner = re.compile(r'^#\s*nospeccleaner\s*$', re.IGNORECASE)
+    re_spec_macrofunc = re.compile(r'^\s*%define\s(\w+)\(.*')
 
     # rpminstall
     re_clean = re.compile(r'rm\s+(-?\w?\ ?)*"?(%{buildroot}|\$b)"?$')
@@ -205,28 +209,81 @@ class Regexp(object):
     )
 
     # cleaning path regexps
+    # these are multiline as they are also run over the whole text of the batched sections,
+    # the newline matched by '\s' is always put back by the replacement
     endmacro = r'([/\s%"]|$)'
-    re_oldprefix = re.compile(r'%{?_exec_prefix}?' + endmacro)
-    re_prefix = re.compile(r'(?<!\w)/usr' + endmacro)
-    re_bindir = re.compile(r'%{?_prefix}?/bin' + endmacro)
-    re_sbindir = re.compile(r'%{?_prefix}?/sbin' + endmacro)
-    re_libexecdir = re.compile(r'%{?_prefix}?/libexec' + endmacro)
-    re_includedir = re.compile(r'%{?_prefix}?/include' + endmacro)
-    re_datadir = re.compile(r'%{?_prefix}?/share' + endmacro)
-    re_mandir = re.compile(r'%{?_datadir}?/man' + endmacro)
-    re_infodir = re.compile(r'%{?_datadir}?/info' + endmacro)
-    re_docdir = re.compile(r'%{?_datadir}?/doc/packages' + endmacro)
-    re_initdir = re.compile(r'/etc/init.d' + endmacro)
-    re_sysconfdir = re.compile(r'/etc' + endmacro)
-    re_localstatedir = re.compile(r'/var' + endmacro)
-    re_libdir = re.compile(r'%{?_prefix}?/(%{?_lib}?|lib64)' + endmacro)
-    re_initddir = re.compile(r'%{?_initrddir}?' + endmacro)
-    re_rpmbuildroot = re.compile(r'(\${?RPM_BUILD_ROOT}?|"%{?buildroot}?")([/\s%]|$)')
+    re_oldprefix = re.compile(r'%{?_exec_prefix}?' + endmacro, re.MULTILINE)
+    re_prefix = re.compile(r'(?<!\w)/usr' + endmacro, re.MULTILINE)
+    re_bindir = re.compile(r'%{?_prefix}?/bin' + endmacro, re.MULTILINE)
+    re_sbindir = re.compile(r'%{?_prefix}?/sbin' + endmacro, re.MULTILINE)
+    re_libexecdir = re.compile(r'%{?_prefix}?/libexec' + endmacro, re.MULTILINE)
+    re_includedir = re.compile(r'%{?_prefix}?/include' + endmacro, re.MULTILINE)
+    re_datadir = re.compile(r'%{?_prefix}?/share' + endmacro, re.MULTILINE)
+    re_mandir = re.compile(r'%{?_datadir}?/man' + endmacro, re.MULTILINE)
+    re_infodir = re.compile(r'%{?_datadir}?/info' + endmacro, re.MULTILINE)
+    re_docdir = re.compile(r'%{?_datadir}?/doc/packages' + endmacro, re.MULTILINE)
+    re_initdir = re.compile(r'/etc/init.d' + endmacro, re.MULTILINE)
+    re_sysconfdir = re.compile(r'/etc' + endmacro, re.MULTILINE)
+    re_localstatedir = re.compile(r'/var' + endmacro, re.MULTILINE)
+    re_libdir = re.compile(r'%{?_prefix}?/(%{?_lib}?|lib64)' + endmacro, re.MULTILINE)
+    re_initddir = re.compile(r'%{?_initrddir}?' + endmacro, re.MULTILINE)
+    re_rpmbuildroot = re.compile(
+        r'(\${?RPM_BUILD_ROOT}?|"%{?buildroot}?")([/\s%]|$)', re.MULTILINE
+    )
     re_rpmbuildroot_quotes = re.compile(r'"\${?RPM_BUILD_ROOT}?"')
     # deprecated greps
     re_deprecated_egrep_regex = re.compile(r'\begrep\b')
     re_deprecated_fgrep_regex = re.compile(r'\bfgrep\b')
 
+    # unbracing of the keywords
+    re_plain_keyword = re.compile(r'^\w+$')
+
     def __init__(self, keywords: List[str]) -> None:
-        """Compile all the keywords that are to be unbraced."""
-        self.re_unbrace_keywords = re.compile('%{(' + '|'.join(keywords) + ')}')
+        """
+        Prepare all the keywords that are to be unbraced.
+
+        Plain macro names are only looked up in a set, the few whitelist entries that are
+        patterns are compiled into the shared scanning regexp (once per process).
+        """
+        self.unbrace_keywords = frozenset(k for k in keywords if self.re_plain_keyword.match(k))
+        self.re_unbrace_keywords = self._compile_unbrace_regexp(
+            tuple(k for k in keywords if k not in self.unbrace_keywords)
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _compile_unbrace_regexp(patterns: Tuple[str, ...]) -> Pattern[str]:
+        """
+        Compile the regexp finding braced macros that are candidates for unbracing.
+
+        Args:
+            patterns: A tuple of keywords that are regular expressions and not plain macro names.
+
+        Returns:
+            The compiled regexp, with the 'pattern' group for the pattern keywords and the 'name'
+            group for any other braced macro name.
+        """
+        # '(?!)' never matches so we have valid regexp even without any patterns
+        alternatives = '|'.join(patterns) or '(?!)'
+        return re.compile(r'%{(?:(?P<pattern>' + alternatives + r')|(?P<name>\w+))}')
+
+    def _unbrace_match(self, match: Match[str]) -> str:
+        if match.group('pattern') is not None:
+            return '%' + match.group('pattern')
+        if match.group('name') in self.unbrace_keywords:
+            return '%' + match.group('name')
+        return match.group(0)
+
+    def unbrace(self, line: str) -> str:
+        """
+        Replace known keywords back to the braceless state.
+
+        Args:
+            line: A string representing a line to process.
+
+        Returns:
+            The line with the keywords unbraced.
+        """
+        if '%{' not in line:
+            return line
+        return self.re_unbrace_keywords.sub(self._unbrace_match, line)
@@ -1,4 +1,6 @@
-from typing import Optional
+import sys
+from functools import lru_cache
+from typing import Any, List, Optional
 
 from .rpmexception import RpmException
 from .rpmregexp import Regexp
@@ -15,9 +17,20 @@ class RpmRequiresToken(object):
 
     prefix            name          operator   version
     BuildRequires:    boringpackage >=         5.2.8
+
+    The tokens are immutable (only the comments attached to them can be changed), the name and
+    the operator are normalized when the token is created and the rendered line is cached. Use
+    with_prefix() to get the token with another prefix.
     """
 
-    comments: Optional[str] = None
+    __slots__ = ('prefix', 'name', 'operator', 'version', 'comments', '_string')
+
+    prefix: Optional[str]
+    name: str
+    operator: Optional[str]
+    version: Optional[str]
+    comments: Optional[List[str]]
+    _string: Optional[str]
 
     def __init__(
         self,
@@ -26,10 +39,42 @@ class RpmRequiresToken(object):
         version: Optional[str] = None,
         prefix: Optional[str] = None,
     ) -> None:
-        self.prefix = prefix
-        self.name = name
-        self.operator = operator
-        self.version = version
+        """
+        Create the token with the normalized name and operator.
+
+        Args:
+            name: A string with the name of the dependency.
+            operator: A string with the version operator (or None).
+            version: A string with the version (or None).
+            prefix: A string with the prefix (e.g. 'BuildRequires:  ') or None.
+        """
+        setattr_ = object.__setattr__
+        setattr_(self, 'prefix', sys.intern(prefix) if prefix else prefix)
+        setattr_(self, 'name', self._format_name(name) if name else name)
+        setattr_(self, 'operator', self._format_operator(operator) if operator else operator)
+        setattr_(self, 'version', version)
+        setattr_(self, 'comments', None)
+        setattr_(self, '_string', None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Allow only the comments to be changed."""
+        if name != 'comments':
+            raise AttributeError('RpmRequiresToken is immutable, can\'t set "{0}"'.format(name))
+        object.__setattr__(self, name, value)
+
+    def with_prefix(self, prefix: str) -> 'RpmRequiresToken':
+        """
+        Get the same dependency token with the given prefix.
+
+        Args:
+            prefix: A string with the prefix (e.g. 'BuildRequires:  ').
+
+        Returns:
+            A new RpmRequiresToken with the same name, operator, version and comments.
+        """
+        token = RpmRequiresToken(self.name, self.operator, self.version, prefix)
+        token.comments = self.comments
+        return token
 
     @staticmethod
     def _format_operator(operator: str) -> str:
@@ -48,6 +93,7 @@ class RpmRequiresToken(object):
         return operator
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _format_name(name: str) -> str:
         """
         Make sure the name looks sane and make various replacements.
@@ -83,7 +129,13 @@ class RpmRequiresToken(object):
         Raises:
             RpmException if prefix or name is not defined or the version is defined but no operator is present.
         """
-        self.name = self._format_name(self.name)
+        string = self._string
+        if string is None:
+            string = self._render()
+            object.__setattr__(self, '_string', string)
+        return string
+
+    def _render(self) -> str:
         if not self.prefix:
             raise RpmException(
                 'No defined prefix in RequiresToken: prefix "{0}" name "{1}" operator "{2}" version "{3}"'.format(
@@ -100,7 +152,6 @@ class RpmRequiresToken(object):
         if (self.version and not self.operator) or (not self.version and self.operator):
             raise RpmException('Have defined version and no operator or vice versa')
         if self.version and self.operator:
-            self.operator = self._format_operator(self.operator)
             string += ' ' + self.operator + ' ' + self.version
 
         return string
@@ -0,0 +1,306 @@
+# vim: set ts=4 sw=4 et: coding=UTF-8
+
+"""Registry of the cleanup rules that are run over the lines of the sections."""
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    cast,
+)
+
+
+class Rule(NamedTuple):
+    """
+    Declaration of one cleanup rule.
+
+    Attributes:
+        name: A string with the name of the rule (used by '--disable-rule').
+        method: A string with the name of the section method implementing the rule. The method
+                takes the line and returns the processed line (or None if the line is dropped).
+        sections: A tuple of section class names the rule applies to (including their subclasses).
+        mode: 'minimal' if the rule is run even in the minimal mode, 'full' otherwise.
+        triggers: A tuple of literals where at least one must be present in the line for the rule
+                  to do anything. The rule is always run if there are none.
+        order: An int specifying the position of the rule in the pipeline.
+        stage: 'cleanup' for the common cleanups run on all non-comment lines,
+               'line' for the section specific rules run afterwards.
+        batch: A flag indicating whether the cleanup is context-free and can be run over the whole
+               text of the batched section at once.
+        disabled_by: A string with the name of the option that disables the rule.
+    """
+
+    name: str
+    method: str
+    sections: Tuple[str, ...]
+    mode: str = 'minimal'
+    triggers: Tuple[str, ...] = ()
+    order: int = 0
+    stage: str = 'line'
+    batch: bool = False
+    disabled_by: Optional[str] = None
+
+
+RULES = (
+    # common cleanups
+    Rule(
+        'curlification',
+        'embrace_macros',
+        ('Section',),
+        mode='full',
+        triggers=('%',),
+        order=10,
+        stage='cleanup',
+        disabled_by='no_curlification',
+    ),
+    Rule(
+        'buildroot',
+        'replace_buildroot',
+        ('Section',),
+        triggers=('RPM_BUILD_ROOT', 'buildroot'),
+        order=20,
+        stage='cleanup',
+        batch=True,
+    ),
+    Rule(
+        'optflags',
+        'replace_optflags',
+        ('Section',),
+        triggers=('RPM_OPT_FLAGS',),
+        order=30,
+        stage='cleanup',
+        batch=True,
+    ),
+    Rule(
+        'known-dirs',
+        'replace_known_dirs',
+        ('Section',),
+        triggers=('/usr', '_prefix', '/etc', '/var', '_datadir', '_initrddir'),
+        order=40,
+        stage='cleanup',
+        batch=True,
+    ),
+    Rule(
+        'utils',
+        'replace_utils',
+        ('Section',),
+        triggers=('%{__', '%__', 'grep'),
+        order=50,
+        stage='cleanup',
+        batch=True,
+    ),
+    Rule(
+        'buildservice',
+        'replace_buildservice',
+        ('Section',),
+        triggers=('_version}',),
+        order=60,
+        stage='cleanup',
+        batch=True,
+    ),
+    Rule(
+        'preamble-macros',
+        'replace_preamble_macros',
+        ('Section',),
+        triggers=('%{P:', '%{S:'),
+        order=70,
+        stage='cleanup',
+        batch=True,
+    ),
+    Rule(
+        'python-expand',
+        'replace_python_expand',
+        ('Section',),
+        triggers=('python_expand',),
+        order=80,
+        stage='cleanup',
+    ),
+    # %build
+    Rule(
+        'suse-update-config',
+        '_remove_suse_update_config',
+        ('RpmBuild',),
+        triggers=('suse_update_config',),
+        order=10,
+    ),
+    Rule('macro-calls', '_comment_macro_calls', ('RpmBuild',), mode='full', order=20),
+    # %check (and %build)
+    Rule('jobs', '_replace_jobs', ('RpmCheck', 'RpmInstall'), triggers=('_smp_', 'jobs'), order=30),
+    Rule('pytest', '_replace_pytest', ('RpmCheck',), mode='full', triggers=('%python_',), order=40),
+    Rule(
+        'unittest',
+        '_replace_unittest',
+        ('RpmCheck',),
+        mode='full',
+        triggers=('%python_',),
+        order=50,
+    ),
+    Rule('make', '_replace_make', ('RpmCheck',), mode='full', triggers=('make',), order=60),
+    # %install
+    Rule('clean-buildroot', '_remove_clean_buildroot', ('RpmInstall',), triggers=('rm',), order=10),
+    Rule(
+        'remove-la', '_replace_remove_la', ('RpmInstall',), mode='full', triggers=('.la',), order=40
+    ),
+    Rule(
+        'install-command',
+        '_replace_install_command',
+        ('RpmInstall',),
+        mode='full',
+        triggers=('install',),
+        order=50,
+    ),
+    # %prep
+    Rule('setup', '_cleanup_setup', ('RpmPrep',), triggers=('%setup',), order=10),
+    Rule('patch', '_prepare_patch', ('RpmPrep',), mode='full', triggers=('%patch',), order=20),
+    Rule(
+        'dephell',
+        '_remove_dephell_call',
+        ('RpmPrep',),
+        mode='full',
+        triggers=('dephell',),
+        order=30,
+    ),
+    # %files
+    Rule('files-spaces', 'strip_useless_spaces', ('RpmFiles',), order=10),
+    Rule('doc-on-man', '_remove_doc_on_man', ('RpmFiles',), triggers=('%doc',), order=20),
+    Rule('license-from-doc', '_move_license_from_doc', ('RpmFiles',), triggers=('%doc',), order=30),
+    Rule('empty-doc', '_remove_empty_doc', ('RpmFiles',), triggers=('%doc',), order=40),
+    Rule(
+        'defattr', '_remove_defattr', ('RpmFiles',), mode='full', triggers=('%defattr',), order=50
+    ),
+    Rule(
+        'man-compression',
+        '_set_man_compression',
+        ('RpmFiles',),
+        mode='full',
+        triggers=('%{_mandir}', '%{_infodir}'),
+        order=60,
+    ),
+    Rule('empty-lines', '_remove_duplicate_empty_line', ('RpmFiles',), order=70),
+    # scriptlets
+    Rule('ldconfig', '_remove_deprecated_ldconfig', ('RpmScriptlets',), order=10),
+)
+
+RULE_NAMES = tuple(sorted(rule.name for rule in RULES))
+
+
+def compile_rules(rules: Sequence[Rule]) -> Callable[..., Callable[[str], Optional[str]]]:
+    """
+    Create the function running the given rules.
+
+    The rules which can't apply in the run are not there at all, so only the triggers are checked
+    while the lines are processed. As the rule methods are bound to the section objects,
+    a factory is returned and it takes the methods (in the order of rules) as arguments.
+
+    Args:
+        rules: A sequence of the rules to run.
+
+    Returns:
+        The factory creating the function for given rule methods.
+    """
+    triggers = tuple(rule.triggers for rule in rules)
+
+    def factory(*methods: Callable[[str], Optional[str]]) -> Callable[[str], Optional[str]]:
+        steps = tuple(zip(triggers, methods))
+
+        def run(line: str) -> Optional[str]:
+            for rule_triggers, method in steps:
+                if rule_triggers and not any(trigger in line for trigger in rule_triggers):
+                    continue
+                processed = method(line)
+                # only the section specific rules can drop the line
+                if processed is None:
+                    return None
+                line = processed
+            return line
+
+        return run
+
+    return factory
+
+
+class RulePipeline(NamedTuple):
+    """
+    Rules of one section class in the order they are run.
+
+    Attributes:
+        cleanup: A tuple of the rules run on all the non-comment lines.
+        line: A tuple of the section specific rules.
+        run_cleanup: A factory of the function running the cleanup rules.
+        run_line: A factory of the function running the section specific rules.
+    """
+
+    cleanup: Tuple[Rule, ...]
+    line: Tuple[Rule, ...]
+    run_cleanup: Callable[..., Callable[[str], str]]
+    run_line: Callable[..., Callable[[str], Optional[str]]]
+
+
+class RuleRegistry(object):
+    """
+    Compile the declared rules into the pipelines of section classes.
+
+    Only the rules enabled for the options of the run end up in the pipelines, so no option
+    needs to be checked while the lines are processed.
+
+    Attributes:
+        rules: A list of the rules enabled in this run.
+        _pipelines: A dict mapping section classes to their compiled pipelines.
+    """
+
+    def __init__(self, options: Dict[str, Any]) -> None:
+        """
+        Select the rules enabled for the options.
+
+        Args:
+            options: A dictionary holding spec-cleaner command line options.
+        """
+        disabled = set(options.get('disable_rule') or [])
+        self.rules: List[Rule] = [
+            rule
+            for rule in RULES
+            if rule.name not in disabled
+            and not (rule.mode == 'full' and options['minimal'])
+            and not (rule.disabled_by and options[rule.disabled_by])
+        ]
+        self._pipelines: Dict[Type[Any], RulePipeline] = {}
+
+    def compile(self, sections: Iterable[Type[Any]]) -> None:
+        """
+        Compile the pipelines of the given section classes ahead.
+
+        Args:
+            sections: The section classes to compile.
+        """
+        for section in sections:
+            self.pipeline(section)
+
+    def pipeline(self, section: Type[Any]) -> RulePipeline:
+        """
+        Get the pipeline of the section class.
+
+        Args:
+            section: The section class.
+
+        Returns:
+            The compiled pipeline.
+        """
+        if section not in self._pipelines:
+            names = {cls.__name__ for cls in section.__mro__}
+            rules = sorted(
+                (rule for rule in self.rules if names.intersection(rule.sections)),
+                key=lambda rule: rule.order,
+            )
+            cleanup = tuple(rule for rule in rules if rule.stage == 'cleanup')
+            line = tuple(rule for rule in rules if rule.stage == 'line')
+            # the cleanup rules never drop the line
+            run_cleanup = cast(Callable[..., Callable[[str], str]], compile_rules(cleanup))
+            self._pipelines[section] = RulePipeline(cleanup, line, run_cleanup, compile_rules(line))
+        return self._pipelines[section]
@@ -1,6 +1,5 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
-from typing import IO
-
+from .fileutils import SpecWriter
 from .rpmsection import Section
 
 
@@ -11,10 +10,7 @@ class RpmScriptlets(Section):
     Do %post -p /sbin/ldconfig when only scriplet command is /sbin/ldconfig.
     """
 
-    def add(self, line: str) -> None:
-        line = self._complete_cleanup(line)
-        line = self._remove_deprecated_ldconfig(line)
-        Section.add(self, line)
+    batched = True
 
     def _remove_deprecated_ldconfig(self, line: str) -> str:
         """
@@ -29,7 +25,8 @@ class RpmScriptlets(Section):
         line = self.reg.re_ldconfig.sub('/sbin/ldconfig', line)
         return line
 
-    def output(self, fout: IO[str], newline: bool = True, new_class_name: str = None) -> None:
+    def output(self, fout: SpecWriter, newline: bool = True, new_class_name: str = None) -> None:
+        self.flush()
         if not self.minimal:
             self._collapse_multiline_ldconfig()
         Section.output(self, fout, newline, new_class_name)
@@ -1,8 +1,83 @@
 # vim: set ts=4 sw=4 et: coding=UTF-8
-from typing import IO, Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from .fileutils import SpecWriter
 from .rpmregexp import Regexp
 
+# utility macros replaced with the commands
+UTILS_COMMANDS = {
+    'id_u': 'id -u',
+    'ln_s': 'ln -s',
+    'lzma': 'xz --format-lzma',
+    'mkdir_p': 'mkdir -p',
+    'awk': 'gawk',
+    'cc': 'gcc',
+    'cpp': 'gcc -E',
+    'cxx': 'g++',
+    'remsh': 'rsh',
+}
+# utility macros replaced with the command of the same name
+UTILS_COMMANDS.update(
+    (util, util)
+    for util in (
+        'aclocal',
+        'ar',
+        'as',
+        'autoconf',
+        'autoheader',
+        'automake',
+        'bzip2',
+        'cat',
+        'chgrp',
+        'chmod',
+        'chown',
+        'cp',
+        'cpio',
+        'file',
+        'gpg',
+        'grep',
+        'gzip',
+        'id',
+        'install',
+        'ld',
+        'libtoolize',
+        'make',
+        'mkdir',
+        'mv',
+        'nm',
+        'objcopy',
+        'objdump',
+        'patch',
+        'perl',
+        'python',
+        'python2',
+        'python3',
+        'pypy3',
+        'ranlib',
+        'restorecon',
+        'rm',
+        'rsh',
+        'sed',
+        'semodule',
+        'ssh',
+        'strip',
+        'tar',
+        'unzip',
+        'xz',
+    )
+)
+
+# replacements done by replace_utils, selected by the minimal mode flag
+# (the minimal mode also replaces the braceless macros as there is no curlification)
+UTILS_REPLACEMENTS = {
+    False: [('%{__' + util + '}', command) for util, command in UTILS_COMMANDS.items()],
+    True: [
+        replacement
+        for util, command in UTILS_COMMANDS.items()
+        for replacement in (('%{__' + util + '}', command), ('%__' + util, command))
+    ],
+}
+
 
 class Section(object):
     """
@@ -23,9 +98,20 @@ class Section(object):
         no_curlification: A flag indicating whether we want to convert variables to curly brackets.
         reg: A Regexp object that holds all regexps that will be used in spec-cleaner.
         condition: A flag representing if we are in the conditional or not.
+        batched: A flag indicating whether the section holds no state that is needed while the
+                 spec is read, so the lines can be stored and cleaned all at once (see 'flush').
         _condition_counter: An int for counting in how many (nested) condition we currently are.
+        _cleanup_rules: A list of the cleanup rules (triggers, method, batch flag) compiled for
+                        the run.
+        _run_cleanup: A function running all the cleanup rules on the line.
+        _run_line_rules: A function running all the section specific rules on the line.
+        _utils_replacements: A list of the utility macros and their replacements for the run.
+        _pending: A list of the stored lines of the batched section that were not processed yet.
+        _flushing: A flag indicating whether the stored lines are being processed.
     """
 
+    batched: bool = False
+
     def __init__(self, options: Dict[str, Any]) -> None:
         self.lines: List[str] = []
         self.previous_line: Optional[str] = None
@@ -36,6 +122,20 @@ class Section(object):
         # Are we inside of conditional or not
         self.condition: bool = False
         self._condition_counter: int = 0
+        self._pending: List[str] = []
+        self._flushing: bool = False
+        # Rules enabled in this run
+        pipeline = options['rules'].pipeline(type(self))
+        self._cleanup_rules: List[Tuple[Tuple[str, ...], Callable[[str], str], bool]] = [
+            (rule.triggers, getattr(self, rule.method), rule.batch) for rule in pipeline.cleanup
+        ]
+        self._run_cleanup: Callable[[str], str] = pipeline.run_cleanup(
+            *(getattr(self, rule.method) for rule in pipeline.cleanup)
+        )
+        self._run_line_rules: Callable[[str], Optional[str]] = pipeline.run_line(
+            *(getattr(self, rule.method) for rule in pipeline.line)
+        )
+        self._utils_replacements: List[Tuple[str, str]] = UTILS_REPLACEMENTS[self.minimal]
 
     def _complete_cleanup(self, line: str) -> str:
         """
@@ -54,19 +154,61 @@ class Section(object):
         # remove nbsp for normal spaces
         line = line.replace(u'\xa0', ' ')
 
+        # the batched section was already cleaned up as a whole
+        if self._flushing:
+            return line
+
         if not line.startswith('#'):
-            if not self.minimal and not self.no_curlification:
-                line = self.embrace_macros(line)
-            line = self.replace_buildroot(line)
-            line = self.replace_optflags(line)
-            line = self.replace_known_dirs(line)
-            line = self.replace_utils(line)
-            line = self.replace_buildservice(line)
-            line = self.replace_preamble_macros(line)
-            line = self.replace_python_expand(line)
+            line = self._run_cleanup(line)
 
         return line
 
+    def _batched_cleanup(self, lines: List[str]) -> List[str]:
+        """
+        Call the context-free cleanups of '_complete_cleanup' on all the lines at once.
+
+        Every batch rule is run only once over the joined text of all the non-comment lines,
+        the other rules are run line by line. If the number of lines does not match after
+        a batch rule, the lines are cleaned one by one.
+
+        Args:
+            lines: A list of the lines to process.
+
+        Returns:
+            A list of the cleaned lines.
+        """
+        lines = [line.rstrip().replace(u'\xa0', ' ') for line in lines]
+        code = [i for i, line in enumerate(lines) if not line.startswith('#')]
+        if not code:
+            return lines
+
+        cleaned = [lines[i] for i in code]
+        text = None
+        for triggers, rule, batch in self._cleanup_rules:
+            if batch:
+                if text is None:
+                    text = '\n'.join(cleaned)
+                if not triggers or any(trigger in text for trigger in triggers):
+                    text = rule(text)
+                continue
+            if text is not None:
+                cleaned = text.split('\n')
+                text = None
+                if len(cleaned) != len(code):
+                    return [self._complete_cleanup(line) for line in lines]
+            cleaned = [
+                rule(line) if not triggers or any(trigger in line for trigger in triggers) else line
+                for line in cleaned
+            ]
+        if text is not None:
+            cleaned = text.split('\n')
+            if len(cleaned) != len(code):
+                return [self._complete_cleanup(line) for line in lines]
+
+        for i, line in zip(code, cleaned):
+            lines[i] = line
+        return lines
+
     def _check_conditions(self, line: str) -> None:
         """
         Set 'condition' member to True if we are in condition that is contained (False otherwise).
@@ -86,23 +228,71 @@ class Section(object):
         else:
             self.condition = False
 
-    def add(self, line: str) -> None:
+    def read(self, line: str) -> None:
         """
-        Run the cleanup of the line and add the line to the list of lines.
+        Pass the line read from the specfile to the section.
+
+        The batched section just stores the line and keeps the conditions up to date as those
+        are needed while the spec is read. Other sections add the line right away.
 
         Args:
             line: A string representing a line to process.
         """
-        line = self._complete_cleanup(line)
+        if not self.batched:
+            self.add(line)
+            return
 
-        # conditions detect
+        line = line.rstrip().replace(u'\xa0', ' ')
         self._check_conditions(line)
+        self._pending.append(line)
+
+    def flush(self) -> None:
+        """Clean up all the stored lines of the batched section and add them one by one."""
+        if not self._pending:
+            return
+
+        pending = self._batched_cleanup(self._pending)
+        self._pending = []
+        self._flushing = True
+        try:
+            for line in pending:
+                self.add(line)
+        finally:
+            self._flushing = False
+
+    def add(self, line: str) -> None:
+        """
+        Run the cleanup and the section rules on the line and add the line to the list of lines.
+
+        Args:
+            line: A string representing a line to process.
+        """
+        processed = self._run_line_rules(self._complete_cleanup(line))
+        # some rule dropped the line
+        if processed is None:
+            return
+
+        self._append(processed)
+
+    def _append(self, line: str) -> None:
+        """
+        Add the already processed line to the list of lines.
+
+        Args:
+            line: A string representing a line to add.
+        """
+        # the rules can leave trailing whitespace behind
+        line = line.rstrip()
+
+        # conditions detect, the batched section already did it while reading
+        if not self._flushing:
+            self._check_conditions(line)
 
         # append to the file
         self.lines.append(line)
         self.previous_line = line
 
-    def output(self, fout: IO[str], newline: bool = True, new_class_name: str = None) -> None:
+    def output(self, fout: SpecWriter, newline: bool = True, new_class_name: str = None) -> None:
         """
         Manage printing of the section.
 
@@ -110,10 +300,12 @@ class Section(object):
         so do not put nothing bellow. Also if we are jumping away just after writing one macroed line.
 
         Args:
-            fout: A file object representing the output file.
+            fout: A SpecWriter with the output.
             newline: A flag indicating whether we want to add a newline.
             new_class_name: A string with the Section name.
         """
+        self.flush()
+
         # we don't want to create new line
         if newline and len(self.lines) >= 1:
             if (
@@ -136,8 +328,7 @@ class Section(object):
                 ):
                     self.lines.pop()
 
-        for line in self.lines:
-            fout.write(line + '\n')
+        fout.write_lines(self.lines)
 
     @staticmethod
     def strip_useless_spaces(line: str) -> str:
@@ -183,7 +374,7 @@ class Section(object):
                 previous = sp[0]
 
         # and replace back known keywords to braceless state again
-        sp[0] = self.reg.re_unbrace_keywords.sub(r'%\1', sp[0])
+        sp[0] = self.reg.unbrace(sp[0])
         # re-create the line back
         return '#'.join(sp)
 
@@ -273,71 +464,8 @@ class Section(object):
         Returns:
             The line without macros for utilities.
         """
-        r = {
-            'id_u': 'id -u',
-            'ln_s': 'ln -s',
-            'lzma': 'xz --format-lzma',
-            'mkdir_p': 'mkdir -p',
-            'awk': 'gawk',
-            'cc': 'gcc',
-            'cpp': 'gcc -E',
-            'cxx': 'g++',
-            'remsh': 'rsh',
-        }
-        for i in r:
-            line = line.replace('%{__' + i + '}', r[i])
-            if self.minimal:
-                line = line.replace('%__' + i, r[i])
-
-        for i in (
-            'aclocal',
-            'ar',
-            'as',
-            'autoconf',
-            'autoheader',
-            'automake',
-            'bzip2',
-            'cat',
-            'chgrp',
-            'chmod',
-            'chown',
-            'cp',
-            'cpio',
-            'file',
-            'gpg',
-            'grep',
-            'gzip',
-            'id',
-            'install',
-            'ld',
-            'libtoolize',
-            'make',
-            'mkdir',
-            'mv',
-            'nm',
-            'objcopy',
-            'objdump',
-            'patch',
-            'perl',
-            'python',
-            'python2',
-            'python3',
-            'pypy3',
-            'ranlib',
-            'restorecon',
-            'rm',
-            'rsh',
-            'sed',
-            'semodule',
-            'ssh',
-            'strip',
-            'tar',
-            'unzip',
-            'xz',
-        ):
-            line = line.replace('%{__' + i + '}', i)
-            if self.minimal:
-                line = line.replace('%__' + i, i)
+        for macro, replacement in self._utils_replacements:
+            line = line.replace(macro, replacement)
 
         line = self.reg.re_deprecated_egrep_regex.sub(r'grep -E', line)
         line = self.reg.re_deprecated_fgrep_regex.sub(r'grep -F', line)
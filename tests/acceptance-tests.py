@@ -5,7 +5,9 @@ In this module we run all the tests to ensure the spec-cleaner is acting sanely.
 """
 
 
+import io
 import os
+import subprocess
 from glob import glob
 from shutil import copyfile
 
@@ -49,6 +51,7 @@ class TestCompare(object):
         'pkgconfig': False,
         'inline': False,
         'diff': False,
+        'diff_format': 'program',
         'diff_prog': 'vimdiff',
         'minimal': False,
         'no_curlification': False,
@@ -120,6 +123,31 @@ class TestCompare(object):
             test, None, infile=tmpfile, outfile='', options={'pkgconfig': True, 'inline': True}
         )
 
+    def test_stdin_function(self, tmpfile, monkeypatch):
+        """Test reading the spec from stdin ('-')."""
+        test = 'bconds.spec'
+        with open(os.path.join('tests', 'in', test)) as f:
+            monkeypatch.setattr('sys.stdin', io.StringIO(f.read()))
+        self._run_individual_test(
+            test, 'out', infile='-', outfile=tmpfile, options={'pkgconfig': True}
+        )
+
+    def test_conversion_lookup(self, tmpfile):
+        """Test the conversions are looked up by the dependency name as written in the spec."""
+        infile = tmpfile + '.in'
+        with open(infile, 'w') as f:
+            f.write('BuildRequires:  otherproviders(glib2-devel)\nBuildRequires:  libxml2-devel\n')
+        self._run_individual_test(
+            None, None, infile=infile, outfile=tmpfile, options={'pkgconfig': True}
+        )
+        with open(tmpfile) as f:
+            lines = f.read().splitlines()
+        assert lines[:3] == [
+            'BuildRequires:  glib2-devel',
+            'BuildRequires:  pkgconfig',
+            'BuildRequires:  pkgconfig(libxml-2.0)',
+        ]
+
     def test_diff_function(self, tmpfile):
         """Test passing an incorrect '--diff_prog' option."""
         test = 'bconds.spec'
@@ -128,6 +156,33 @@ class TestCompare(object):
                 test, None, outfile='', options={'diff': True, 'diff_prog': 'error'}
             )
 
+    def test_unified_diff_function(self, tmpfile, capsys):
+        """Test printing the unified diff."""
+        test = 'bconds.spec'
+        self._run_individual_test(
+            test, None, outfile='', options={'diff': True, 'diff_format': 'unified'}
+        )
+        diff = capsys.readouterr().out.splitlines()
+        assert diff[:2] == ['--- a/tests/in/bconds.spec', '+++ b/tests/in/bconds.spec']
+        assert diff[2].startswith('@@ ')
+
+    def test_unified_diff_absolute_path(self, tmpfile, capsys, monkeypatch):
+        """Test applying the unified diff of the spec given by its absolute path."""
+        test = 'bconds.spec'
+        workdir = os.path.dirname(tmpfile)
+        infile = os.path.join(workdir, test)
+        copyfile(os.path.join('tests', 'in', test), infile)
+        self._run_individual_test(test, None, infile=infile, outfile=tmpfile, options={})
+        monkeypatch.chdir(workdir)
+        self._run_individual_test(
+            test, None, infile=infile, outfile='', options={'diff': True, 'diff_format': 'unified'}
+        )
+        diff = capsys.readouterr().out
+        assert diff.startswith('--- a/bconds.spec\n+++ b/bconds.spec\n')
+        subprocess.run(['git', 'apply'], input=diff.encode(), cwd=workdir, check=True)
+        with open(infile) as patched, open(tmpfile) as cleaned:
+            assert patched.read() == cleaned.read()
+
     def test_unicode(self, tmpfile):
         """Test encoding."""
         test = 'perl-Text-Unidecode.spec'
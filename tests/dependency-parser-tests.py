@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from spec_cleaner.dependency_parser import (
+    DependencyParser,
+    DepParserError,
+    dependency_tokens,
+    parse_dependencies,
+)
+from spec_cleaner.rpmexception import RpmException
+
+
+class TestDependencyParser(object):
+
+    """
+    We run few tests to ensure the dependency values are split properly
+    """
+
+    def test_simple(self):
+        assert DependencyParser('perl(Foo::Bar) => 1.0').parsed == [('perl(Foo::Bar)', '=>', '1.0')]
+        assert DependencyParser(' foo ').parsed == [('foo', None, None)]
+
+    def test_chunks(self):
+        assert DependencyParser('foo%{?_isa} = %{version}, bar (baz or qux)').parsed == [
+            ('foo%{?_isa}', '=', '%{version}'),
+            ('bar', None, None),
+            ('(baz or qux)', None, None),
+        ]
+        assert DependencyParser('foo == 1 bar>2').parsed == [('foo', '==', '1'), ('bar', '>', '2')]
+
+    def test_errors(self):
+        with pytest.raises(DepParserError):
+            DependencyParser('foo >= 1<2')
+        with pytest.raises(DepParserError):
+            DependencyParser('foo >=')
+        # reported as the other errors of the cleaning
+        with pytest.raises(RpmException):
+            DependencyParser('foo >=')
+
+    def test_cached_tokens(self):
+        parse_dependencies.cache_clear()
+        first = dependency_tokens('foo >= 1, bar')
+        second = dependency_tokens('foo >= 1, bar')
+        assert [token.name for token in second] == ['foo', 'bar']
+        assert first[0] is not second[0]
+        assert parse_dependencies.cache_info().hits == 1
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+
 import pytest
 
 from spec_cleaner import RpmException
-from spec_cleaner.fileutils import open_datafile, open_stringio_spec
+from spec_cleaner.fileutils import SpecWriter, open_datafile, open_spec
 
 
 class TestFileutils(object):
@@ -15,16 +17,74 @@ class TestFileutils(object):
 
     def test_open_assertion(self):
         with pytest.raises(RpmException):
-            open_stringio_spec('missing-file.txt')
+            open_spec('missing-file.txt')
 
     def test_open_datafile_assertion(self):
         with pytest.raises(RpmException):
             open_datafile('missing-file.txt')
 
     def test_open(self):
-        data = open_stringio_spec('tests/fileutils-tests.py')
+        data = open_spec('tests/fileutils-tests.py')
         data.close()
 
     def test_open_datafile(self):
         data = open_datafile('excludes-bracketing.txt')
         data.close()
+
+    def test_writer_replaces_on_commit(self, tmpdir):
+        target = str(tmpdir.join('test.spec'))
+        with open(target, 'w') as f:
+            f.write('original\n')
+        os.chmod(target, 0o640)
+        writer = SpecWriter.open(target)
+        writer.write_lines(['cleaned', 'spec'])
+        writer.flush()
+        with open(target) as f:
+            assert f.read() == 'original\n'
+        writer.commit()
+        with open(target) as f:
+            assert f.read() == 'cleaned\nspec\n'
+        assert os.stat(target).st_mode & 0o777 == 0o640
+        assert tmpdir.listdir() == [tmpdir.join('test.spec')]
+
+    def test_writer_keeps_symlink(self, tmpdir):
+        target = tmpdir.join('real.spec')
+        target.write('original\n')
+        link = tmpdir.join('test.spec')
+        link.mksymlinkto(target)
+        writer = SpecWriter.open(str(link))
+        writer.write_lines(['cleaned'])
+        writer.commit()
+        assert link.islink()
+        assert target.read() == 'cleaned\n'
+        assert sorted(tmpdir.listdir()) == [target, link]
+
+    def test_writer_discard(self, tmpdir):
+        target = str(tmpdir.join('test.spec'))
+        writer = SpecWriter.open(target)
+        writer.write('partial')
+        writer.close()
+        assert tmpdir.listdir() == []
+
+    def test_writer_unchanged(self, tmpdir):
+        target = str(tmpdir.join('test.spec'))
+        with open(target, 'w') as f:
+            f.write('clean\nspec\n')
+        os.utime(target, (0, 0))
+        writer = SpecWriter.open(target)
+        writer.write_lines(['clean', 'spec'])
+        writer.commit()
+        assert writer.unchanged
+        assert os.stat(target).st_mtime == 0
+        assert tmpdir.listdir() == [tmpdir.join('test.spec')]
+
+    def test_open_spec_rereads(self, tmpdir):
+        path = str(tmpdir.join('test.spec'))
+        with open(path, 'wb') as f:
+            f.write(b'Name: test\r\n\nVersion: 1\rRelease: 0\n\n%changelog')
+        spec = open_spec(path)
+        lines = list(spec)
+        assert lines[:3] == ['Name: test\n', '\n', 'Version: 1\n']
+        spec.seek(0)
+        assert list(spec) == lines
+        spec.close()
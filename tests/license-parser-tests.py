@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from spec_cleaner.license_parser import (
+    Compound,
+    Group,
+    License,
+    LicenseParseError,
+    WithException,
+    load_license_database,
+    normalize_license,
+    parse_license,
+)
+
+
+class TestLicenseParser(object):
+
+    """
+    We run few tests to ensure the license expressions are parsed properly
+    """
+
+    def test_precedence(self):
+        assert parse_license('GPL-2.0+ or MIT and (BSD-3-Clause;Zlib)') == Compound(
+            'OR',
+            (
+                License('GPL-2.0+'),
+                Compound(
+                    'AND',
+                    (
+                        License('MIT'),
+                        Group(Compound('AND', (License('BSD-3-Clause'), License('Zlib')))),
+                    ),
+                ),
+            ),
+        )
+        assert parse_license('GPL-2.0+').plus
+
+    def test_exception(self):
+        expression = parse_license('GPL-3.0-or-later WITH GCC-exception-3.1')
+        assert isinstance(expression, WithException)
+        assert expression.license.base == 'GPL-3.0-or-later'
+        assert 'GCC-exception-3.1' in load_license_database().exceptions
+
+    def test_normalize(self):
+        conversions = {'GPLv2 or later': 'GPL-2.0-or-later'}
+        expression = parse_license('( GPLv2 or later and MIT) or Zlib')
+        assert normalize_license(expression, conversions) == '(GPL-2.0-or-later AND MIT) OR Zlib'
+
+    def test_errors(self):
+        for value in ('', 'MIT and', '(MIT', 'MIT) or (Zlib'):
+            with pytest.raises(LicenseParseError):
+                parse_license(value)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import time
+from functools import lru_cache
+
+import pytest
+
+from spec_cleaner.profiler import MemoryProfiler, NullProfiler, Profiler
+
+
+class TestProfiler(object):
+
+    """
+    We run few tests to ensure the profiler collects the phases
+    """
+
+    def test_phases(self):
+        profiler = Profiler()
+        with profiler.phase('scan') as stats:
+            stats.lines += 3
+        with profiler.phase('scan'):
+            pass
+        add = profiler.wrap(lambda line: line, 'add', counts_lines=True)
+        add('a')
+        add('b')
+        assert profiler.phases['scan'].calls == 2
+        assert profiler.phases['scan'].lines == 3
+        assert profiler.phases['add'].calls == 2
+        assert profiler.phases['add'].lines == 2
+        output = io.StringIO()
+        profiler.report(output)
+        lines = output.getvalue().splitlines()
+        assert lines[0].split() == ['phase', 'calls', 'inclusive', 'exclusive', '%', 'lines']
+        assert [line.split()[0] for line in lines[1:]] == ['scan', 'add', 'outside', 'total']
+
+    def test_exclusive_time(self):
+        profiler = Profiler()
+        with profiler.phase('outer'):
+            with profiler.phase('inner'):
+                time.sleep(0.02)
+        outer = profiler.phases['outer']
+        inner = profiler.phases['inner']
+        assert outer.seconds >= inner.seconds >= 0.02
+        assert outer.exclusive < 0.02
+        assert inner.exclusive == inner.seconds
+        assert outer.exclusive + inner.exclusive == pytest.approx(outer.seconds)
+
+    def test_batched_section(self):
+        class Section(object):
+            batched = True
+
+            def __init__(self):
+                self.pending = []
+                self.lines = []
+
+            def read(self, line):
+                self.pending.append(line)
+
+            def flush(self):
+                for line in self.pending:
+                    self.add(line)
+
+            def add(self, line):
+                self.lines.append(line.upper())
+
+            def output(self):
+                self.flush()
+
+        profiler = Profiler()
+        section = Section()
+        profiler.instrument_section(section)
+        section.read('a')
+        section.read('b')
+        section.output()
+        assert section.lines == ['A', 'B']
+        assert [(name, stats.calls, stats.lines) for name, stats in profiler.phases.items()] == [
+            ('Section.read', 2, 2),
+            ('Section.add', 2, 2),
+            ('Section.flush', 1, 0),
+            ('Section.output', 1, 0),
+        ]
+
+    def test_cache_stats(self):
+        cached = lru_cache(maxsize=None)(len)
+        cached('a')
+        profiler = Profiler()
+        profiler.track_cache('len', cached)
+        for value in ('a', 'a', 'bb'):
+            cached(value)
+        output = io.StringIO()
+        profiler.report(output)
+        lines = output.getvalue().splitlines()
+        assert lines[-2].split() == ['cache', 'hits', 'misses', '%', 'size']
+        assert lines[-1].split() == ['len', '2', '1', '66.7', '2']
+
+    def test_null_profiler(self):
+        profiler = NullProfiler()
+        function = len
+        assert profiler.wrap(function, 'len') is function
+        with profiler.phase('scan') as stats:
+            stats.lines += 1
+        assert profiler.phases == {}
+
+    def test_memory_profiler(self):
+        profiler = MemoryProfiler(top=3)
+        kept = []
+        with profiler.phase('outer'):
+            with profiler.phase('inner'):
+                kept.append(bytearray(100000))
+            bytearray(200000)
+        assert profiler.phases['inner'].retained >= 100000
+        assert profiler.phases['outer'].retained >= 100000
+        assert profiler.phases['outer'].peak >= 200000
+        output = io.StringIO()
+        profiler.report(output)
+        lines = output.getvalue().splitlines()
+        assert lines[0].split() == [
+            'phase', 'calls', 'max', 'peak', 'KiB', 'sum', 'retained', 'KiB', 'lines'
+        ]
+        assert [line.split()[0] for line in lines[1:4]] == ['outer', 'inner', 'total']
+        assert lines[5] == 'top 3 allocation sites (retained)'
+        assert 'profiler-tests.py' in lines[6]
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from spec_cleaner.rpmhelpers import fix_license, merge_conversions
+
+
+class TestRpmHelpers(object):
+
+    """
+    We run few tests to ensure the helpers work fine
+    """
+
+    def test_merge_conversions(self):
+        index = merge_conversions(
+            [
+                ('pkgconfig', {'foo-devel': 'foo bar\n', 'pkgconfig': 'pkg-config\n'}),
+                ('cmake', {'foo-devel': 'Foo\n', 'baz-devel': 'Baz\n'}),
+            ]
+        )
+        assert index == {
+            'foo-devel': ('pkgconfig(foo)', 'pkgconfig(bar)'),
+            'baz-devel': ('cmake(Baz)',),
+        }
+
+    def test_fix_license(self):
+        conversions = {'GPLv2+': 'GPL-2.0-or-later'}
+        assert fix_license('GPLv2+; MIT', conversions) == 'GPL-2.0-or-later AND MIT'
+        assert fix_license('GPLv2+; MIT', conversions) == 'GPL-2.0-or-later AND MIT'
+        assert fix_license('GPLv2+; MIT', {}) == 'GPLv2+ AND MIT'
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from spec_cleaner.rpmrequirestoken import RpmRequiresToken
+
+
+class TestRpmRequiresToken(object):
+
+    """
+    We run few tests to ensure the dependency tokens are normalized and immutable
+    """
+
+    def test_normalized_on_creation(self):
+        token = RpmRequiresToken('otherproviders(foo)', '=>', '1.0')
+        assert token.name == 'foo'
+        assert token.operator == '>='
+        assert str(token.with_prefix('Requires:       ')) == 'Requires:       foo >= 1.0'
+
+    def test_immutable(self):
+        token = RpmRequiresToken('foo', prefix='Requires:       ')
+        with pytest.raises(AttributeError):
+            token.name = 'bar'
+        token.comments = ['# comment']
+        assert token.with_prefix('Provides:       ').comments == ['# comment']
+        assert str(token) == 'Requires:       foo'
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from spec_cleaner.rpmbuild import RpmBuild
+from spec_cleaner.rpmfiles import RpmFiles
+from spec_cleaner.rpmpreamble import RpmPreamble
+from spec_cleaner.rpmrules import RULES, RuleRegistry
+
+
+class TestRpmRules(object):
+
+    """
+    We run few tests to ensure the rules are compiled to proper pipelines
+    """
+
+    options = {'minimal': False, 'no_curlification': False}
+
+    def _names(self, rules):
+        return [rule.name for rule in rules]
+
+    def test_unique_names(self):
+        names = self._names(RULES)
+        assert len(names) == len(set(names))
+
+    def test_inherited_pipeline(self):
+        pipeline = RuleRegistry(self.options).pipeline(RpmBuild)
+        assert self._names(pipeline.cleanup)[0] == 'curlification'
+        assert self._names(pipeline.line) == [
+            'suse-update-config',
+            'macro-calls',
+            'jobs',
+            'pytest',
+            'unittest',
+            'make',
+        ]
+        assert not RuleRegistry(self.options).pipeline(RpmPreamble).line
+
+    def test_minimal_pipeline(self):
+        options = dict(self.options, minimal=True)
+        pipeline = RuleRegistry(options).pipeline(RpmFiles)
+        assert 'curlification' not in self._names(pipeline.cleanup)
+        assert self._names(pipeline.line) == [
+            'files-spaces',
+            'doc-on-man',
+            'license-from-doc',
+            'empty-doc',
+            'empty-lines',
+        ]
+
+    def test_disabled_rules(self):
+        options = dict(self.options, no_curlification=True, disable_rule=['known-dirs', 'make'])
+        registry = RuleRegistry(options)
+        cleanup = self._names(registry.pipeline(RpmBuild).cleanup)
+        assert 'curlification' not in cleanup
+        assert 'known-dirs' not in cleanup
+        assert 'make' not in self._names(registry.pipeline(RpmBuild).line)